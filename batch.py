@@ -0,0 +1,454 @@
+# batch.py
+
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from database import Database
+from invoice import ENGINES, RenderCache, create_invoice_pdf, default_renderer
+from utils import calculate_totals, to_decimal
+
+# Configure logging
+logging.basicConfig(
+    filename='invoice_app.log',
+    level=logging.ERROR,
+    format='%(asctime)s:%(levelname)s:%(message)s'
+)
+
+# Invoices written to the database per transaction
+COMMIT_BATCH_SIZE = 200
+
+# Render jobs kept queued per worker process
+JOBS_PER_WORKER = 4
+
+# One subdirectory per company, so equal numbers of two companies never share a file
+FILENAME_TEMPLATE = os.path.join("{invoicing_company}", "Invoice_{invoice_number}.pdf")
+
+HEADER_FIELDS = (
+    "invoicing_company",
+    "client_company",
+    "invoice_date",
+    "expiry_date",
+    "reference",
+    "vat_exempt",
+)
+
+
+def read_jsonl(path):
+    """
+    Reads invoice specs from a JSON Lines file, one invoice per line:
+
+        {"invoicing_company": "...", "client_company": "...",
+         "invoice_date": "dd-mm-yyyy", "expiry_date": "dd-mm-yyyy",
+         "reference": "...", "vat_exempt": false,
+         "items": [{"description": "...", "hours": 8,
+                    "price_exc": "800.00", "vat": "168.00"}]}
+
+    invoice_date, expiry_date, reference and vat_exempt are optional.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: {e}")
+
+
+def read_csv(path):
+    """
+    Reads invoice specs from a CSV file with one row per item. Columns are
+    the invoice fields of read_jsonl plus description, hours, price_exc and
+    vat. Consecutive rows with the same invoice fields (or the same
+    invoice_key, if that column exists) form one invoice.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        current_key = None
+        spec = None
+        for row in reader:
+            if "invoice_key" in row:
+                key = row["invoice_key"]
+            else:
+                key = tuple(row.get(field, "") for field in HEADER_FIELDS)
+            if spec is None or key != current_key:
+                if spec is not None:
+                    yield spec
+                current_key = key
+                spec = {field: row[field] for field in HEADER_FIELDS if row.get(field)}
+                spec["items"] = []
+            spec["items"].append({
+                "description": row["description"],
+                "hours": row.get("hours") or 0,
+                "price_exc": row["price_exc"],
+                "vat": row.get("vat") or 0,
+            })
+        if spec is not None:
+            yield spec
+
+
+def read_specs(path):
+    if path.lower().endswith(".csv"):
+        return read_csv(path)
+    return read_jsonl(path)
+
+
+def parse_flag(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y")
+    return bool(value)
+
+
+def safe_filename(name):
+    """Turns a company name into a file or directory name valid on every platform."""
+    name = re.sub(r'[<>:"/\\|?*\x00-\x1f]', "_", name).strip(" .")
+    return name or "_"
+
+
+def prepare_invoice(db, spec):
+    """
+    Validates a spec and resolves company and client details.
+
+    Returns:
+        dict: Keyword arguments for create_invoice_pdf, without
+        pdf_filename and invoice_number.
+    """
+    invoicing_company = (spec.get("invoicing_company") or "").strip()
+    client_company = (spec.get("client_company") or "").strip()
+    if not invoicing_company or not client_company:
+        raise ValueError("invoicing_company and client_company are required.")
+
+    company_details = db.get_invoicing_company_details(invoicing_company)
+    if not company_details:
+        raise ValueError(f"Details for {invoicing_company} not found.")
+    client_details = db.get_client_details(client_company)
+    if not client_details:
+        raise ValueError(f"Details for {client_company} not found.")
+    kvk, vat_nr, bank, iban, bic = company_details
+    (client_address,) = client_details
+    logo, font = db.get_invoicing_company_branding(invoicing_company) or (None, None)
+
+    invoice_date = spec.get("invoice_date") or datetime.today().strftime("%d-%m-%Y")
+    expiry_date = spec.get("expiry_date") or (
+        datetime.strptime(invoice_date, "%d-%m-%Y") + timedelta(days=30)
+    ).strftime("%d-%m-%Y")
+    try:
+        datetime.strptime(invoice_date, "%d-%m-%Y")
+        datetime.strptime(expiry_date, "%d-%m-%Y")
+    except ValueError:
+        raise ValueError("Please enter dates in the format dd-mm-yyyy.")
+
+    vat_exempt = parse_flag(spec.get("vat_exempt", False))
+    items = []
+    for serial, item in enumerate(spec.get("items") or [], start=1):
+        price_exc = to_decimal(item["price_exc"])
+        vat_val = to_decimal(0 if vat_exempt else item.get("vat"))
+        items.append({
+            "serial": str(serial),
+            "description": item["description"],
+            "hours": float(item.get("hours") or 0),
+            "price_exc": price_exc,
+            "vat": vat_val,
+            "total": price_exc + vat_val,
+        })
+    if not items:
+        raise ValueError("Please add at least one valid item.")
+
+    return {
+        "invoicing_company": invoicing_company,
+        "kvk": kvk,
+        "vat_nr": vat_nr,
+        "bank": bank,
+        "iban": iban,
+        "bic": bic,
+        "client_company": client_company,
+        "client_address": client_address,
+        "invoice_date": invoice_date,
+        "expiry_date": expiry_date,
+        "reference": spec.get("reference") or "",
+        "items": items,
+        "vat_exempt": vat_exempt,
+        "logo": logo,
+        "font": font,
+        **calculate_totals(items, vat_exempt),
+    }
+
+
+def init_worker(cache_dir):
+    # Runs once in every worker process
+    if cache_dir:
+        default_renderer.cache = RenderCache(directory=cache_dir)
+
+
+def render_invoice(pdf_kwargs):
+    # Runs in a worker process
+    create_invoice_pdf(**pdf_kwargs)
+    return pdf_kwargs["pdf_filename"]
+
+
+def invoice_record(pdf_kwargs):
+    return {
+        "invoicing_company": pdf_kwargs["invoicing_company"],
+        "client_company": pdf_kwargs["client_company"],
+        "invoice_number": int(pdf_kwargs["invoice_number"]),
+        "invoice_date": pdf_kwargs["invoice_date"],
+        "expiry_date": pdf_kwargs["expiry_date"],
+        "reference": pdf_kwargs["reference"],
+        "total_exc": pdf_kwargs["total_exc"],
+        "total_vat": pdf_kwargs["total_vat"],
+        "grand_total": pdf_kwargs["grand_total"],
+        "vat_exempt": pdf_kwargs["vat_exempt"],
+        "pdf_filename": pdf_kwargs["pdf_filename"],
+        "items": pdf_kwargs["items"],
+        "kvk": pdf_kwargs["kvk"],
+        "vat_nr": pdf_kwargs["vat_nr"],
+        "bank": pdf_kwargs["bank"],
+        "iban": pdf_kwargs["iban"],
+        "bic": pdf_kwargs["bic"],
+        "client_address": pdf_kwargs["client_address"],
+    }
+
+
+class Progress:
+    def __init__(self, total, stream=sys.stderr):
+        self.total = total
+        self.stream = stream
+        self.done = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+        self.last_report = 0.0
+
+    def update(self, ok):
+        self.done += 1
+        if not ok:
+            self.failed += 1
+        now = time.perf_counter()
+        if now - self.last_report >= 0.5 or self.done == self.total:
+            self.last_report = now
+            self.stream.write(
+                f"\r[{self.done}/{self.total}] {self.rate():.1f} invoices/s, "
+                f"{self.failed} failed"
+            )
+            self.stream.flush()
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def rate(self):
+        elapsed = self.elapsed()
+        return self.done / elapsed if elapsed else 0.0
+
+
+def run_batch(db, specs, output_dir=".", workers=None,
+              filename_template=FILENAME_TEMPLATE,
+              commit_batch_size=COMMIT_BATCH_SIZE, engine="platypus", cache_dir=None,
+              stream=sys.stderr):
+    """
+    Generates invoices headlessly: allocates numbers through the database,
+    renders the PDFs in a process pool and stores the invoices in batches.
+    Numbers are reserved one commit batch at a time, as the batch is
+    submitted; numbers reserved but not stored (failed renders, or an
+    interrupted run) are logged.
+
+    filename_template is formatted with invoice_number and the company name
+    made safe for file names as invoicing_company. With cache_dir, the
+    workers share a RenderCache in that directory.
+
+    Returns:
+        dict: Throughput statistics of the run.
+
+    Raises:
+        ValueError: If two invoices would be written to the same file.
+    """
+    if commit_batch_size < 1:
+        raise ValueError("commit_batch_size must be at least 1.")
+    started = time.perf_counter()
+    prepared = []
+    failed = 0
+    for index, spec in enumerate(specs, start=1):
+        try:
+            prepared.append(prepare_invoice(db, spec))
+        except (ValueError, KeyError) as e:
+            failed += 1
+            logging.error("Invalid invoice spec %d: %s", index, e)
+            stream.write(f"Skipping invoice spec {index}: {e}\n")
+
+    def pdf_filename(company_name, invoice_number):
+        return os.path.normpath(os.path.join(output_dir, filename_template.format(
+            invoicing_company=safe_filename(company_name), invoice_number=invoice_number)))
+
+    by_company = {}
+    for pdf_kwargs in prepared:
+        by_company.setdefault(pdf_kwargs["invoicing_company"], []).append(pdf_kwargs)
+
+    # Refuse to start if the template sends two invoices to the same file,
+    # before any number is reserved
+    owners = {}
+    for company_name, invoices in by_company.items():
+        next_number = db.get_last_invoice_number(company_name) + 1
+        for offset in range(len(invoices)):
+            invoice_number = next_number + offset
+            path = os.path.normcase(pdf_filename(company_name, invoice_number))
+            if path in owners:
+                raise ValueError(
+                    f"Invoice {owners[path][1]} of {owners[path][0]} and invoice {invoice_number} "
+                    f"of {company_name} would both be written to {path}; "
+                    "use {invoicing_company} and {invoice_number} in the filename template."
+                )
+            owners[path] = (company_name, invoice_number)
+
+    prepare_seconds = time.perf_counter() - started
+
+    # (company, number) pairs reserved in the sequence but not stored yet
+    unstored = set()
+
+    def reserve(chunk):
+        # One sequence reservation per company in the chunk
+        chunk_by_company = {}
+        for pdf_kwargs in chunk:
+            chunk_by_company.setdefault(pdf_kwargs["invoicing_company"], []).append(pdf_kwargs)
+        for company_name, invoices in chunk_by_company.items():
+            first = db.allocate_invoice_numbers(company_name, len(invoices))
+            for offset, pdf_kwargs in enumerate(invoices):
+                invoice_number = first + offset
+                unstored.add((company_name, invoice_number))
+                pdf_kwargs["invoice_number"] = str(invoice_number)
+                pdf_kwargs["engine"] = engine
+                pdf_kwargs["pdf_filename"] = pdf_filename(company_name, invoice_number)
+                os.makedirs(os.path.dirname(pdf_kwargs["pdf_filename"]) or ".", exist_ok=True)
+
+    def numbered_jobs():
+        for start in range(0, len(prepared), commit_batch_size):
+            chunk = prepared[start:start + commit_batch_size]
+            reserve(chunk)
+            yield from chunk
+
+    progress = Progress(len(prepared), stream)
+    pending_rows = []
+    stored = 0
+
+    def flush():
+        nonlocal stored
+        if not pending_rows:
+            return
+        results = db.add_invoices_bulk(pending_rows)
+        for row, inserted in zip(pending_rows, results):
+            if inserted:
+                stored += 1
+                unstored.discard((row["invoicing_company"], row["invoice_number"]))
+            else:
+                logging.error("Invoice %s of %s already exists in the database",
+                              row["invoice_number"], row["invoicing_company"])
+        pending_rows.clear()
+
+    workers = workers or os.cpu_count() or 1
+    jobs = numbered_jobs()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(cache_dir,)) as executor:
+            in_flight = {}
+
+            def submit_next():
+                pdf_kwargs = next(jobs, None)
+                if pdf_kwargs is not None:
+                    in_flight[executor.submit(render_invoice, pdf_kwargs)] = pdf_kwargs
+
+            for _ in range(workers * JOBS_PER_WORKER):
+                submit_next()
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pdf_kwargs = in_flight.pop(future)
+                    try:
+                        future.result()
+                    except Exception:
+                        logging.error("Error rendering %s", pdf_kwargs["pdf_filename"], exc_info=True)
+                        progress.update(ok=False)
+                    else:
+                        pending_rows.append(invoice_record(pdf_kwargs))
+                        progress.update(ok=True)
+                        if len(pending_rows) >= commit_batch_size:
+                            flush()
+                    submit_next()
+    finally:
+        # Keep what was rendered, then account for every number left unused
+        flush()
+        by_company = {}
+        for company_name, invoice_number in unstored:
+            by_company.setdefault(company_name, []).append(invoice_number)
+        for company_name, numbers in by_company.items():
+            logging.error("Invoice numbers of %s reserved but not stored: %s",
+                          company_name, ", ".join(str(n) for n in sorted(numbers)))
+    if prepared:
+        stream.write("\n")
+
+    elapsed = time.perf_counter() - started
+    return {
+        "specs": len(prepared) + failed,
+        "rendered": progress.done - progress.failed,
+        "stored": stored,
+        "failed": failed + progress.failed + (progress.done - progress.failed - stored),
+        "workers": workers,
+        "prepare_seconds": round(prepare_seconds, 3),
+        "render_seconds": round(progress.elapsed(), 3),
+        "total_seconds": round(elapsed, 3),
+        "invoices_per_second": round(stored / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate invoices in bulk from a CSV or JSONL file."
+    )
+    parser.add_argument("specs", help="CSV (one row per item) or JSONL (one invoice per line) file")
+    parser.add_argument("--db", default="invoice_app.db", help="SQLite database (default: %(default)s)")
+    parser.add_argument("--output-dir", default=".", help="Directory for the PDFs (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Render processes (default: number of CPUs)")
+    parser.add_argument("--filename-template", default=FILENAME_TEMPLATE,
+                        help="PDF path within the output directory; may use {invoice_number} and "
+                             "{invoicing_company} (default: %(default)s)")
+    parser.add_argument("--commit-batch-size", type=int, default=COMMIT_BATCH_SIZE,
+                        help="Invoices stored per transaction (default: %(default)s)")
+    parser.add_argument("--engine", choices=ENGINES, default="platypus",
+                        help="PDF rendering engine (default: %(default)s)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Keep rendered PDFs in this directory and reuse them for identical invoices")
+    parser.add_argument("--wal", action="store_true",
+                        help="Switch the database to WAL mode so the GUI can keep reading during the run")
+    args = parser.parse_args(argv)
+
+    db = Database(args.db, wal=args.wal)
+    try:
+        stats = run_batch(
+            db,
+            read_specs(args.specs),
+            output_dir=args.output_dir,
+            workers=args.workers,
+            filename_template=args.filename_template,
+            commit_batch_size=args.commit_batch_size,
+            engine=args.engine,
+            cache_dir=args.cache_dir,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        db.close()
+
+    print(json.dumps(stats, indent=2))
+    return 0 if stats["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Needed for the pyinstaller build on Windows
+    sys.exit(main())
@@ -0,0 +1,128 @@
+# benchmarks/render_engines.py
+
+"""
+Compares the Platypus and canvas invoice engines.
+
+Prints invoices/second for both engines at a few invoice sizes and checks
+that they produce the same pages: the same words in the same places, and
+nearly identical rasterised pages. The equivalence check needs PyMuPDF
+(pip install pymupdf) and is skipped without it.
+
+Usage:
+    python benchmarks/render_engines.py [--seconds 2] [--check-only]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+
+from synthetic import SAMPLE_FONT, sample_invoice, sample_logo
+
+from invoice import ENGINES, create_invoice_pdf
+
+try:
+    import pymupdf
+except ImportError:
+    pymupdf = None
+
+BENCH_SIZES = (1, 10, 50)
+
+# Words may be placed this far apart (pt) and still count as the same
+POSITION_TOLERANCE = 0.5
+
+# Share of raster pixels allowed to differ, for anti-aliasing of lines
+PIXEL_TOLERANCE = 0.002
+
+
+def benchmark(seconds):
+    print(f"{'items':>6}  " + "  ".join(f"{engine + ' inv/s':>16}" for engine in ENGINES))
+    for item_count in BENCH_SIZES:
+        invoice = sample_invoice(item_count)
+        rates = []
+        for engine in ENGINES:
+            create_invoice_pdf(None, engine=engine, **invoice)  # warm up
+            count = 0
+            started = time.perf_counter()
+            while time.perf_counter() - started < seconds:
+                create_invoice_pdf(None, engine=engine, **invoice)
+                count += 1
+            rates.append(count / (time.perf_counter() - started))
+        print(f"{item_count:>6}  " + "  ".join(f"{rate:>16.1f}" for rate in rates))
+
+
+def page_words(document):
+    return [
+        sorted(
+            (text, round(x0 / POSITION_TOLERANCE), round(y1 / POSITION_TOLERANCE))
+            for x0, y0, x1, y1, text, *_ in page.get_text("words")
+        )
+        for page in document
+    ]
+
+
+def pixel_difference(page_a, page_b):
+    a = page_a.get_pixmap(dpi=50).samples
+    b = page_b.get_pixmap(dpi=50).samples
+    if len(a) != len(b):
+        return 1.0
+    return sum(1 for x, y in zip(a, b) if abs(x - y) > 64) / len(a)
+
+
+def check_equivalence():
+    """
+    Renders sample invoices with both engines and compares the pages.
+
+    Returns:
+        bool: True if every case matches.
+    """
+    if pymupdf is None:
+        print("Equivalence check skipped: PyMuPDF is not installed.")
+        return True
+
+    logo = sample_logo(tempfile.mkdtemp())
+    cases = {
+        "short": (sample_invoice(3), {}),
+        "branded": (sample_invoice(3, logo=logo, font=SAMPLE_FONT), {}),
+        "vat exempt, wrapped address": (sample_invoice(
+            5, vat_exempt=True,
+            client_address="Industrial Estate North, Building 12, Unit 4, "
+                           "Long Street 1234, 9999 ZZ Somewhere Far Away, The Netherlands",
+        ), {}),
+        # Multi-page tables repeat their header row, as the large mode does
+        "multi-page": (sample_invoice(150), {"large": True}),
+    }
+    ok = True
+    for name, (invoice, reference_options) in cases.items():
+        reference = pymupdf.open(stream=create_invoice_pdf(None, **invoice, **reference_options))
+        canvas = pymupdf.open(stream=create_invoice_pdf(None, engine="canvas", **invoice))
+        problems = []
+        if len(reference) != len(canvas):
+            problems.append(f"{len(reference)} vs {len(canvas)} pages")
+        else:
+            for number, (words_a, words_b) in enumerate(zip(page_words(reference), page_words(canvas)), 1):
+                if words_a != words_b:
+                    problems.append(f"words differ on page {number}")
+            for number in range(len(reference)):
+                difference = pixel_difference(reference[number], canvas[number])
+                if difference > PIXEL_TOLERANCE:
+                    problems.append(f"{difference:.2%} of pixels differ on page {number + 1}")
+        ok = ok and not problems
+        print(f"{name}: {'; '.join(problems) if problems else 'equivalent'} ({len(reference)} pages)")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the invoice rendering engines.")
+    parser.add_argument("--seconds", type=float, default=2.0,
+                        help="Time per engine and size (default: %(default)s)")
+    parser.add_argument("--check-only", action="store_true", help="Only run the equivalence check")
+    args = parser.parse_args(argv)
+
+    if not args.check_only:
+        benchmark(args.seconds)
+    return 0 if check_equivalence() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
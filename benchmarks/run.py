@@ -0,0 +1,368 @@
+# benchmarks/run.py
+
+"""
+Headless benchmark suite.
+
+Measures PDF rendering by item count, batch throughput and database
+insert, lookup and history latency at growing database sizes, using the
+synthetic data of synthetic.py. Results are written as JSON so two runs can
+be compared.
+
+Usage:
+    python benchmarks/run.py [--suite pdf batch db] [--quick] [--output results.json]
+    python benchmarks/run.py --compare baseline.json results.json
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from synthetic import (
+    batch_specs,
+    client_rows,
+    company_rows,
+    invoice_records,
+    sample_invoice,
+)
+
+# synthetic puts the repository root on sys.path
+import reportlab  # noqa: E402
+
+from batch import run_batch  # noqa: E402
+from database import Database  # noqa: E402
+from invoice import ENGINES, create_invoice_pdf  # noqa: E402
+
+SUITES = ("pdf", "batch", "db")
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# Full runs and --quick runs
+PDF_SIZES = (1, 50, 1000, 20000)
+QUICK_PDF_SIZES = (1, 50, 1000)
+BATCH_INVOICES = 1000
+QUICK_BATCH_INVOICES = 100
+DB_SIZES = (10_000, 100_000, 1_000_000)
+QUICK_DB_SIZES = (1_000, 10_000)
+
+# Minimum measuring time per PDF size
+PDF_SECONDS = 2.0
+
+# Invoices with at least this many items are rendered once, without warm-up
+SINGLE_RUN_ITEMS = 1000
+
+BATCH_ITEMS = 5
+DB_COMPANIES = 20
+DB_CLIENTS = 2000
+
+# Invoices generated and stored per add_invoices_bulk call while filling
+INSERT_CHUNK = 1000
+
+# Calls timed per database operation
+LATENCY_SAMPLES = 200
+
+
+def latency(operation, samples=LATENCY_SAMPLES):
+    """
+    Times `operation` `samples` times; operation receives the sample index.
+
+    Returns:
+        dict: Median, 95th percentile and mean latency in milliseconds.
+    """
+    timings = []
+    for index in range(samples):
+        started = time.perf_counter()
+        operation(index)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "median_ms": round(statistics.median(timings), 4),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 4),
+        "mean_ms": round(statistics.fmean(timings), 4),
+        "samples": samples,
+    }
+
+
+def result(suite, name, params, metrics):
+    return {"suite": suite, "name": name, "params": params, "metrics": metrics}
+
+
+def bench_pdf(sizes, seconds=PDF_SECONDS, log=print):
+    """create_invoice_pdf into memory, per engine and item count."""
+    results = []
+    for item_count in sizes:
+        invoice = sample_invoice(item_count)
+        for engine in ENGINES:
+            single = item_count >= SINGLE_RUN_ITEMS
+            if not single:
+                create_invoice_pdf(None, engine=engine, **invoice)  # warm up
+            timings = []
+            started = time.perf_counter()
+            while True:
+                run_started = time.perf_counter()
+                data = create_invoice_pdf(None, engine=engine, **invoice)
+                timings.append(time.perf_counter() - run_started)
+                if single or time.perf_counter() - started >= seconds:
+                    break
+            median = statistics.median(timings)
+            metrics = {
+                "seconds": round(median, 5),
+                "invoices_per_second": round(1 / median, 2),
+                "items_per_second": round(item_count / median, 1),
+                "bytes": len(data),
+                "runs": len(timings),
+            }
+            log(f"pdf {engine:>8} {item_count:>6} items: {median * 1000:.1f} ms")
+            results.append(result("pdf", "create_invoice_pdf",
+                                  {"engine": engine, "items": item_count}, metrics))
+    return results
+
+
+def bench_batch(invoice_count, workers=None, log=print):
+    """batch.run_batch into a fresh database and output directory, per engine."""
+    results = []
+    companies = company_rows(DB_COMPANIES)
+    clients = client_rows(DB_CLIENTS)
+    specs = list(batch_specs(invoice_count, [row[0] for row in companies],
+                             [row[0] for row in clients], BATCH_ITEMS))
+    for engine in ENGINES:
+        with tempfile.TemporaryDirectory() as directory:
+            db = Database(os.path.join(directory, "bench.db"))
+            try:
+                db.add_invoicing_companies_bulk(companies)
+                db.add_clients_bulk(clients)
+                stats = run_batch(db, specs, output_dir=os.path.join(directory, "pdf"),
+                                  workers=workers, engine=engine, stream=io.StringIO())
+            finally:
+                db.close()
+        log(f"batch {engine:>8}: {stats['invoices_per_second']} invoices/s")
+        results.append(result("batch", "run_batch", {
+            "engine": engine,
+            "invoices": invoice_count,
+            "items": BATCH_ITEMS,
+            "workers": stats["workers"],
+        }, stats))
+    return results
+
+
+def fill_database(db, records, count):
+    """
+    Stores `count` records in INSERT_CHUNK transactions.
+
+    Returns:
+        float: Seconds spent in add_invoices_bulk, excluding data generation.
+    """
+    elapsed = 0.0
+    while count > 0:
+        chunk = [next(records) for _ in range(min(INSERT_CHUNK, count))]
+        started = time.perf_counter()
+        db.add_invoices_bulk(chunk)
+        elapsed += time.perf_counter() - started
+        count -= len(chunk)
+    return elapsed
+
+
+def bench_db_size(db, size, companies, clients, samples, log=print):
+    """Lookup and history latencies against a database of `size` invoices."""
+    rng = random.Random(size)
+    params = {"invoices": size}
+    results = []
+
+    def measure(name, operation):
+        metrics = latency(operation, samples)
+        log(f"db {size:>9} {name}: median {metrics['median_ms']} ms, p95 {metrics['p95_ms']} ms")
+        results.append(result("db", name, params, metrics))
+
+    ids = [rng.randint(1, size) for _ in range(samples)]
+    picked_companies = [rng.choice(companies) for _ in range(samples)]
+    picked_clients = [rng.choice(clients) for _ in range(samples)]
+
+    measure("get_invoice", lambda i: db.get_invoice(ids[i]))
+    measure("get_invoicing_company_details",
+            lambda i: db.get_invoicing_company_details(picked_companies[i]))
+    measure("history_first_page", lambda i: db.get_invoice_page(picked_companies[i]))
+    measure("history_client_page", lambda i: db.get_invoice_page(
+        picked_companies[i], client_company=picked_clients[i]))
+    measure("history_sorted_page", lambda i: db.get_invoice_page(
+        picked_companies[i], sort="grand_total", descending=True))
+    measure("history_filter_count", lambda i: db.get_invoice_totals(
+        picked_companies[i], erroneous=None, text=picked_clients[i][-4:]))
+    measure("invoice_totals", lambda i: db.get_invoice_totals(picked_companies[i]))
+    measure("revenue_by_month", lambda i: db.get_revenue_by_month(picked_companies[i]))
+    measure("search_client", lambda i: db.search(picked_clients[i]))
+
+    # Walk one company's full history; later pages are sampled from its keys
+    keys = []
+    rows = 0
+    after = None
+    started = time.perf_counter()
+    while True:
+        page, after = db.get_invoice_page(companies[0], after=after)
+        rows += len(page)
+        if after is None:
+            break
+        keys.append(after)
+    walk_seconds = time.perf_counter() - started
+    log(f"db {size:>9} history_walk: {rows} rows in {walk_seconds * 1000:.1f} ms")
+    results.append(result("db", "history_walk", params, {
+        "rows": rows,
+        "seconds": round(walk_seconds, 4),
+        "rows_per_second": round(rows / walk_seconds, 1),
+    }))
+    if keys:
+        picked_keys = [rng.choice(keys) for _ in range(samples)]
+        measure("history_next_page", lambda i: db.get_invoice_page(companies[0], after=picked_keys[i]))
+    return results
+
+
+def bench_db(sizes, samples=LATENCY_SAMPLES, log=print):
+    """
+    Fills one database up to each size in turn and measures bulk insert
+    throughput, single-invoice insert latency and read latencies at every size.
+    """
+    results = []
+    company_data = company_rows(DB_COMPANIES)
+    client_data = client_rows(DB_CLIENTS)
+    companies = [row[0] for row in company_data]
+    clients = [row[0] for row in client_data]
+    records = invoice_records(sum(sizes) + len(sizes) * samples, companies, clients)
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(os.path.join(directory, "bench.db"))
+        try:
+            db.add_invoicing_companies_bulk(company_data)
+            db.add_clients_bulk(client_data)
+            stored = 0
+            for size in sizes:
+                added = size - stored
+                if added > 0:
+                    seconds = fill_database(db, records, added)
+                    log(f"db {size:>9} add_invoices_bulk: {added / seconds:.0f} invoices/s")
+                    results.append(result("db", "add_invoices_bulk", {"invoices": size}, {
+                        "added": added,
+                        "seconds": round(seconds, 3),
+                        "invoices_per_second": round(added / seconds, 1),
+                    }))
+                results.extend(bench_db_size(db, size, companies, clients, samples, log))
+
+                # Single inserts last, so the reads above saw exactly `size` invoices
+                single = [next(records) for _ in range(samples)]
+                metrics = latency(lambda i: db.add_invoice(single[i]), samples)
+                log(f"db {size:>9} add_invoice: median {metrics['median_ms']} ms")
+                results.append(result("db", "add_invoice", {"invoices": size}, metrics))
+                stored = max(size, stored) + samples
+        finally:
+            db.close()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).resolve().parent,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "sqlite": sqlite3.sqlite_version,
+        "reportlab": reportlab.Version,
+    }
+
+
+def result_key(entry):
+    return (entry["suite"], entry["name"], json.dumps(entry["params"], sort_keys=True))
+
+
+def compare(baseline_path, current_path):
+    """
+    Prints the change of every numeric metric present in both runs. Times
+    are better when lower, rates (per_second) when higher.
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {result_key(entry): entry for entry in json.load(f)["results"]}
+    with open(current_path, encoding="utf-8") as f:
+        current = json.load(f)["results"]
+
+    print(f"{'benchmark':<60} {'metric':<22} {'baseline':>12} {'current':>12} {'change':>8}")
+    for entry in current:
+        old = baseline.get(result_key(entry))
+        if old is None:
+            continue
+        label = f"{entry['suite']} {entry['name']} " + " ".join(
+            f"{key}={value}" for key, value in entry["params"].items())
+        for metric, value in entry["metrics"].items():
+            if not (metric.endswith("_ms") or metric.endswith("seconds") or metric.endswith("_per_second")):
+                continue
+            previous = old["metrics"].get(metric)
+            if not previous:
+                continue
+            change = (value - previous) / previous
+            worse = change < 0 if metric.endswith("_per_second") else change > 0
+            flag = " worse" if worse and abs(change) >= 0.1 else ""
+            print(f"{label:<60} {metric:<22} {previous:>12g} {value:>12g} {change:>+8.1%}{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the invoice generator benchmarks.")
+    parser.add_argument("--suite", nargs="+", choices=SUITES, default=list(SUITES),
+                        help="Suites to run (default: all)")
+    parser.add_argument("--quick", action="store_true",
+                        help="Smaller sizes, for a check in a few minutes")
+    parser.add_argument("--pdf-sizes", type=int, nargs="+", help="Item counts for the pdf suite")
+    parser.add_argument("--batch-invoices", type=int, help="Invoices in the batch suite")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Batch render processes (default: number of CPUs)")
+    parser.add_argument("--db-sizes", type=int, nargs="+", help="Invoice counts for the db suite")
+    parser.add_argument("--samples", type=int, default=LATENCY_SAMPLES,
+                        help="Calls timed per database operation (default: %(default)s)")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="Compare two results files instead of running")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    log = lambda message: print(message, file=sys.stderr, flush=True)  # noqa: E731
+    results = []
+    if "pdf" in args.suite:
+        sizes = args.pdf_sizes or (QUICK_PDF_SIZES if args.quick else PDF_SIZES)
+        results.extend(bench_pdf(sizes, log=log))
+    if "batch" in args.suite:
+        count = args.batch_invoices or (QUICK_BATCH_INVOICES if args.quick else BATCH_INVOICES)
+        results.extend(bench_batch(count, args.workers, log=log))
+    if "db" in args.suite:
+        sizes = sorted(args.db_sizes or (QUICK_DB_SIZES if args.quick else DB_SIZES))
+        results.extend(bench_db(sizes, args.samples, log=log))
+
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / datetime.now().strftime("%Y%m%d-%H%M%S.json"))
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
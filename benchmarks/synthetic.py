@@ -0,0 +1,162 @@
+# benchmarks/synthetic.py
+
+"""
+Synthetic, reproducible test data for the benchmarks.
+"""
+
+import os
+import random
+import sys
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import reportlab  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+from utils import calculate_totals  # noqa: E402
+
+# TTF font shipped with ReportLab, used for branded invoices
+SAMPLE_FONT = os.path.join(os.path.dirname(reportlab.__file__), "fonts", "Vera.ttf")
+
+WORDS = (
+    "consulting", "development", "review", "design", "support", "migration",
+    "analysis", "testing", "deployment", "training", "workshop", "report",
+    "maintenance", "integration", "audit", "planning",
+)
+
+
+def sample_item(serial, rng=None):
+    """
+    Returns one line item. Every seventh description is long enough to
+    wrap in the items table.
+    """
+    rng = rng or random
+    if serial % 7:
+        description = f"Consulting work, week {serial}"
+    else:
+        description = (
+            f"Development of the reporting module for project {serial}, "
+            "including review sessions, documentation and deployment support"
+        )
+    hours = rng.choice((4, 8, 16, 24, 40))
+    price_exc = Decimal(hours * 100).quantize(Decimal("0.01"))
+    vat = (price_exc * Decimal("0.21")).quantize(Decimal("0.01"))
+    return {
+        "serial": str(serial),
+        "description": description,
+        "hours": float(hours),
+        "price_exc": price_exc,
+        "vat": vat,
+        "total": price_exc + vat,
+    }
+
+
+def sample_items(count, seed=0):
+    """Yields count line items, generated as they are read."""
+    rng = random.Random(seed)
+    for serial in range(1, count + 1):
+        yield sample_item(serial, rng)
+
+
+def sample_invoice(item_count, **overrides):
+    """Returns create_invoice_pdf arguments for a synthetic invoice."""
+    items = list(sample_items(item_count))
+    invoice = {
+        "invoicing_company": "Acme Consulting B.V.",
+        "kvk": "12345678",
+        "vat_nr": "NL001234567B01",
+        "bank": "ING",
+        "iban": "NL00INGB0001234567",
+        "bic": "INGBNL2A",
+        "client_company": "Client Ltd",
+        "client_address": "Main Street 1\n1234 AB Amsterdam",
+        "invoice_number": "42",
+        "invoice_date": "01-01-2026",
+        "expiry_date": "31-01-2026",
+        "reference": "Project X",
+        "items": items,
+        "vat_exempt": False,
+        **calculate_totals(items, False),
+    }
+    invoice.update(overrides)
+    return invoice
+
+
+def sample_logo(directory):
+    """Writes a synthetic 600x200 PNG logo with transparency and returns its path."""
+    path = os.path.join(directory, "logo.png")
+    image = Image.new("RGBA", (600, 200), (255, 255, 255, 0))
+    ImageDraw.Draw(image).rounded_rectangle((10, 10, 590, 190), radius=40, fill=(20, 80, 160, 255))
+    image.save(path)
+    return path
+
+
+def company_rows(count):
+    """(name, kvk, vat_nr, bank, iban, bic) rows for add_invoicing_companies_bulk."""
+    return [
+        (f"Company {n:03d} B.V.", f"{10000000 + n}", f"NL{n:09d}B01", "ING",
+         f"NL00INGB{n:010d}", "INGBNL2A")
+        for n in range(count)
+    ]
+
+
+def client_rows(count):
+    """(name, address) rows for add_clients_bulk."""
+    return [
+        (f"Client {n:05d}", f"Street {n % 300 + 1}\n{1000 + n % 9000} AB City {n % 50}")
+        for n in range(count)
+    ]
+
+
+def invoice_records(count, companies, clients, seed=0, first_day=date(2021, 1, 1), days=5 * 365,
+                    max_items=5):
+    """
+    Yields invoice dicts for Database.add_invoices_bulk, with numbers
+    allocated by the database, dates spread over several years and one to
+    max_items line items each.
+    """
+    rng = random.Random(seed)
+    for _ in range(count):
+        company = rng.choice(companies)
+        client = rng.choice(clients)
+        invoice_date = first_day + timedelta(days=rng.randrange(days))
+        items = [
+            dict(sample_item(serial, rng), description=" ".join(rng.sample(WORDS, 3)))
+            for serial in range(1, rng.randint(1, max_items) + 1)
+        ]
+        yield {
+            "invoicing_company": company,
+            "client_company": client,
+            "invoice_number": None,
+            "invoice_date": invoice_date.strftime("%d-%m-%Y"),
+            "expiry_date": (invoice_date + timedelta(days=30)).strftime("%d-%m-%Y"),
+            "reference": f"PO-{rng.randrange(100000):05d}",
+            "vat_exempt": False,
+            "pdf_filename": None,
+            "items": items,
+            **calculate_totals(items, False),
+        }
+
+
+def batch_specs(count, companies, clients, item_count=5, seed=0):
+    """Yields batch.py invoice specs, as read from a JSONL file."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield {
+            "invoicing_company": rng.choice(companies),
+            "client_company": rng.choice(clients),
+            "invoice_date": "01-01-2026",
+            "reference": f"PO-{rng.randrange(100000):05d}",
+            "items": [
+                {
+                    "description": item["description"],
+                    "hours": item["hours"],
+                    "price_exc": str(item["price_exc"]),
+                    "vat": str(item["vat"]),
+                }
+                for item in sample_items(item_count, rng.random())
+            ],
+        }
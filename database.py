@@ -1,14 +1,259 @@
 # database.py
 
+import queue
 import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+from utils import from_cents, to_cents, to_decimal
+
+# Rows checked per existence query in the bulk insert helpers
+BULK_LOOKUP_CHUNK = 400
+
+# Money is stored as integer cents in <column>_cents; the REAL columns are
+# kept filled for older readers of the database
+INVOICE_MONEY_COLUMNS = ('total_exc', 'total_vat', 'grand_total')
+ITEM_MONEY_COLUMNS = ('price_exc', 'vat', 'total')
+
+# Company and client details as printed on the invoice, kept with it so a
+# re-rendered PDF matches the one that was sent. NULL for older invoices
+COMPANY_SNAPSHOT_COLUMNS = ('kvk', 'vat_nr', 'bank', 'iban', 'bic')
+CLIENT_SNAPSHOT_COLUMNS = ('client_address',)
+
+INVOICE_COLUMNS = (
+    'invoicing_company', 'client_company', 'invoice_number', 'invoice_date',
+    'expiry_date', 'reference', 'total_exc', 'total_vat', 'grand_total',
+    'vat_exempt', 'pdf_filename', 'total_exc_cents', 'total_vat_cents',
+    'grand_total_cents', *COMPANY_SNAPSHOT_COLUMNS, *CLIENT_SNAPSHOT_COLUMNS
+)
+
+ITEM_COLUMNS = (
+    'serial', 'description', 'hours', 'price_exc', 'vat', 'total',
+    'price_exc_cents', 'vat_cents', 'total_cents'
+)
+
+SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+# Sortable yyyy-mm-dd form of the dd-mm-yyyy invoice_date column
+INVOICE_DATE_ISO = (
+    "(substr(invoice_date, 7, 4) || '-' || substr(invoice_date, 4, 2)"
+    " || '-' || substr(invoice_date, 1, 2))"
+)
+
+INVOICE_PAGE_SIZE = 500
+
+# Sort orders of get_invoice_page and the expressions they sort by; ties are
+# broken by id, which also makes the keyset of the next page unique
+INVOICE_SORT_KEYS = {
+    'id': 'id',
+    'invoice_number': 'invoice_number',
+    'invoice_date': INVOICE_DATE_ISO,
+    'client_company': 'client_company',
+    'grand_total': 'grand_total_cents',
+    'pdf_filename': "COALESCE(pdf_filename, '')",
+    'is_erroneous': 'is_erroneous',
+}
+
+# Revenue summary tables and the invoice expressions they are grouped by;
+# {row} is the invoices row the expression is evaluated against
+REVENUE_TABLES = {
+    'revenue_by_company': {
+        'invoicing_company': '{row}.invoicing_company',
+    },
+    'revenue_by_client': {
+        'invoicing_company': '{row}.invoicing_company',
+        'client_company': '{row}.client_company',
+    },
+    'revenue_by_month': {
+        'invoicing_company': '{row}.invoicing_company',
+        'month': "substr({row}.invoice_date, 7, 4) || '-' || substr({row}.invoice_date, 4, 2)",
+    },
+}
+
+REVENUE_COLUMNS = ('invoice_count', 'total_exc_cents', 'total_vat_cents', 'grand_total_cents')
+
+# Columns of the full-text index; each invoice has one row for its header
+# fields plus one row per stored line item
+SEARCH_COLUMNS = ('client_company', 'client_address', 'reference', 'description')
+
+SEARCH_LIMIT = 50
+
+# Default number of entries kept in the company/client details cache
+CACHE_SIZE = 1024
+
+def iso_date(date):
+    """
+    Converts a dd-mm-yyyy date string to the sortable yyyy-mm-dd form.
+    """
+    return f"{date[6:10]}-{date[3:5]}-{date[0:2]}"
+
+def history_row(row):
+    """
+    Converts an (id, invoice_number, invoice_date, client_company,
+    grand_total_cents, pdf_filename, is_erroneous) row to one with a
+    Decimal grand_total.
+    """
+    return row[:4] + (from_cents(row[4]),) + row[5:]
 
 class Database:
-    def __init__(self, db_name="invoice_app.db"):
-        self.conn = sqlite3.connect(db_name)
+    def __init__(self, db_name="invoice_app.db", wal=False, busy_timeout=5000,
+                 synchronous="NORMAL", readers=0, cache_size=CACHE_SIZE):
+        """
+        Opens the database and brings the schema up to date.
+
+        Parameters:
+            db_name (str): Path of the SQLite database file.
+            wal (bool): Switch the database to write-ahead logging so readers
+                do not block the writer and vice versa.
+            busy_timeout (int): Milliseconds to wait on a locked database.
+            synchronous (str): PRAGMA synchronous level used in WAL mode.
+            readers (int): Number of pooled read-only connections used by the
+                query methods. 0 runs every query on the writer connection.
+            cache_size (int): Maximum number of company/client lookups kept
+                in the in-process cache. 0 disables caching.
+        """
+        synchronous = synchronous.upper()
+        if synchronous not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Invalid synchronous level: {synchronous}")
+
+        self.db_name = db_name
+        self.write_lock = threading.RLock()
+        # The writer is shared between threads; write_lock serializes its use
+        self.conn = sqlite3.connect(
+            db_name, timeout=busy_timeout / 1000, check_same_thread=False)
+        self.conn.execute(f'PRAGMA busy_timeout = {int(busy_timeout)}')
+        if wal:
+            self.conn.execute('PRAGMA journal_mode = WAL')
+            self.conn.execute(f'PRAGMA synchronous = {synchronous}')
         self.create_tables()
 
+        # LRU cache for company/client details and name lists
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.cache_lock = threading.Lock()
+        self.cache_generation = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # Pool of read-only connections (not possible for in-memory databases)
+        self.reader_pool = None
+        self.reader_conns = []
+        if readers and db_name != ':memory:':
+            uri = Path(db_name).resolve().as_uri() + '?mode=ro'
+            self.reader_pool = queue.Queue()
+            for _ in range(readers):
+                reader = sqlite3.connect(
+                    uri, uri=True, timeout=busy_timeout / 1000, check_same_thread=False)
+                reader.execute(f'PRAGMA busy_timeout = {int(busy_timeout)}')
+                self.reader_conns.append(reader)
+                self.reader_pool.put(reader)
+
+    @contextmanager
+    def _transaction(self):
+        # Commits on success and rolls back on error
+        with self.write_lock, self.conn:
+            yield self.conn.cursor()
+
+    @contextmanager
+    def _reader(self):
+        if self.reader_pool is None:
+            with self.write_lock:
+                yield self.conn.cursor()
+            return
+        reader = self.reader_pool.get()
+        try:
+            yield reader.cursor()
+        finally:
+            self.reader_pool.put(reader)
+
+    def _cached(self, key, loader):
+        with self.cache_lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.cache_hits += 1
+                return self.cache[key]
+            self.cache_misses += 1
+            generation = self.cache_generation
+        value = loader()
+        with self.cache_lock:
+            # Skip storing if a write invalidated the cache while loading
+            if self.cache_size and generation == self.cache_generation:
+                self.cache[key] = value
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return value
+
+    def _invalidate(self, *keys):
+        with self.cache_lock:
+            self.cache_generation += 1
+            for key in keys:
+                self.cache.pop(key, None)
+
+    def _cache_added_names(self, kind, list_key, names):
+        # Extend a cached name list instead of reloading it after an add
+        with self.cache_lock:
+            self.cache_generation += 1
+            for name in names:
+                self.cache.pop((kind, name), None)
+            if list_key in self.cache:
+                self.cache[list_key] = self.cache[list_key] + list(names)
+
+    def cache_stats(self):
+        """
+        Returns the hit/miss counters and current size of the details cache.
+        """
+        with self.cache_lock:
+            return {
+                'hits': self.cache_hits,
+                'misses': self.cache_misses,
+                'size': len(self.cache),
+            }
+
+    def clear_cache(self):
+        with self.cache_lock:
+            self.cache_generation += 1
+            self.cache.clear()
+
     def create_tables(self):
-        cursor = self.conn.cursor()
+        """
+        Brings the schema up to date. Migrations are numbered by their
+        position in MIGRATIONS and the number of applied ones is stored in
+        PRAGMA user_version, so pending steps run once, together in one
+        transaction, and an up-to-date database needs no schema work.
+        """
+        with self.write_lock:
+            cursor = self.conn.cursor()
+            cursor.execute('PRAGMA user_version')
+            if cursor.fetchone()[0] < len(self.MIGRATIONS):
+                cursor.execute('BEGIN IMMEDIATE')
+                try:
+                    # Re-read under the lock in case another process migrated
+                    cursor.execute('PRAGMA user_version')
+                    version = cursor.fetchone()[0]
+                    for migration in self.MIGRATIONS[version:]:
+                        migration(self, cursor)
+                    cursor.execute(f'PRAGMA user_version = {len(self.MIGRATIONS)}')
+                    self.conn.commit()
+                except Exception:
+                    self.conn.rollback()
+                    raise
+
+            cursor.execute('''
+                SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'invoice_search'
+            ''')
+            self.search_enabled = cursor.fetchone() is not None
+
+    # ----- Schema migrations -----
+    # Each step may run on databases created before user_version was used,
+    # so they tolerate tables and columns that already exist.
+
+    def _column_names(self, cursor, table):
+        cursor.execute(f'PRAGMA table_info({table})')
+        return {row[1] for row in cursor.fetchall()}
+
+    def _migrate_base_tables(self, cursor):
         # Table for Invoicing Companies
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS invoicing_companies (
@@ -30,7 +275,6 @@ class Database:
             )
         ''')
         # Table for invoice history
-        # Table for invoice history
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS invoices (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -47,156 +291,947 @@ class Database:
                 pdf_filename TEXT
             )
         ''')
-        # Add the is_erroneous column if it doesn't exist
-        try:
+        if 'is_erroneous' not in self._column_names(cursor, 'invoices'):
             cursor.execute('ALTER TABLE invoices ADD COLUMN is_erroneous INTEGER DEFAULT 0')
+
+    def _migrate_invoice_indexes(self, cursor):
+        # Indexes for per-company invoice lookups
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_invoices_company_number
+            ON invoices (invoicing_company, invoice_number)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_invoices_company_client
+            ON invoices (invoicing_company, client_company)
+        ''')
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_invoices_company_date
+            ON invoices (invoicing_company, {INVOICE_DATE_ISO}, id)
+        ''')
+
+        # Table holding the last issued invoice number per company, seeded
+        # from the existing invoice history
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS invoice_sequences (
+                invoicing_company TEXT PRIMARY KEY,
+                last_number INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            INSERT OR IGNORE INTO invoice_sequences (invoicing_company, last_number)
+            SELECT invoicing_company, COALESCE(MAX(invoice_number), 0)
+            FROM invoices
+            WHERE invoicing_company IS NOT NULL
+            GROUP BY invoicing_company
+        ''')
+
+    def _migrate_invoice_items(self, cursor):
+        # Table for invoice line items
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS invoice_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                invoice_id INTEGER NOT NULL REFERENCES invoices (id),
+                position INTEGER NOT NULL,
+                serial TEXT,
+                description TEXT,
+                hours REAL,
+                price_exc REAL,
+                vat REAL,
+                total REAL
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_invoice_items_invoice
+            ON invoice_items (invoice_id, position)
+        ''')
+
+    def _migrate_cents_columns(self, cursor):
+        # Integer-cent money columns, converted once from the REAL amounts
+        for table, columns in (('invoices', INVOICE_MONEY_COLUMNS),
+                               ('invoice_items', ITEM_MONEY_COLUMNS)):
+            existing = self._column_names(cursor, table)
+            for column in columns:
+                if f'{column}_cents' in existing:
+                    continue
+                cursor.execute(f'''
+                    ALTER TABLE {table} ADD COLUMN {column}_cents INTEGER NOT NULL DEFAULT 0
+                ''')
+                cursor.execute(f'''
+                    UPDATE {table} SET {column}_cents = CAST(ROUND({column} * 100) AS INTEGER)
+                    WHERE {column} IS NOT NULL
+                ''')
+
+    def _migrate_revenue_tables(self, cursor):
+        # Summary tables kept up to date by triggers on invoices, counting
+        # only invoices that are not marked erroneous. They only hold derived
+        # data, so any existing copy is rebuilt from the invoices.
+        triggers = {
+            # name: (event, condition, sign)
+            'trg_revenue_insert': (
+                'INSERT', 'NEW.is_erroneous = 0', 1),
+            'trg_revenue_mark_erroneous': (
+                'UPDATE OF is_erroneous', 'OLD.is_erroneous = 0 AND NEW.is_erroneous != 0', -1),
+            'trg_revenue_unmark_erroneous': (
+                'UPDATE OF is_erroneous', 'OLD.is_erroneous != 0 AND NEW.is_erroneous = 0', 1),
+        }
+        for name in triggers:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+        for table, keys in REVENUE_TABLES.items():
+            cursor.execute(f'DROP TABLE IF EXISTS {table}')
+            cursor.execute(f'''
+                CREATE TABLE {table} (
+                    {', '.join(f'{key} TEXT NOT NULL' for key in keys)},
+                    invoice_count INTEGER NOT NULL DEFAULT 0,
+                    total_exc_cents INTEGER NOT NULL DEFAULT 0,
+                    total_vat_cents INTEGER NOT NULL DEFAULT 0,
+                    grand_total_cents INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY ({', '.join(keys)})
+                )
+            ''')
+            groups = [expression.format(row='invoices') for expression in keys.values()]
+            cursor.execute(f'''
+                INSERT INTO {table} ({', '.join(keys)}, {', '.join(REVENUE_COLUMNS)})
+                SELECT {', '.join(groups)}, COUNT(*),
+                       {', '.join(f'SUM({column})' for column in REVENUE_COLUMNS[1:])}
+                FROM invoices
+                WHERE is_erroneous = 0 AND invoicing_company IS NOT NULL
+                GROUP BY {', '.join(groups)}
+            ''')
+
+        for name, (event, condition, sign) in triggers.items():
+            cursor.execute(f'''
+                CREATE TRIGGER {name}
+                AFTER {event} ON invoices
+                WHEN {condition}
+                BEGIN
+                    {' '.join(self._revenue_upsert(table, keys, sign) for table, keys in REVENUE_TABLES.items())}
+                END
+            ''')
+
+    def _revenue_upsert(self, table, keys, sign):
+        values = [expression.format(row='NEW') for expression in keys.values()]
+        values += [str(sign)] + [f'{sign} * NEW.{column}' for column in REVENUE_COLUMNS[1:]]
+        return f'''
+            INSERT INTO {table} ({', '.join(keys)}, {', '.join(REVENUE_COLUMNS)})
+            VALUES ({', '.join(values)})
+            ON CONFLICT ({', '.join(keys)}) DO UPDATE SET
+                {', '.join(f'{column} = {column} + excluded.{column}' for column in REVENUE_COLUMNS)};
+        '''
+
+    def _migrate_search_index(self, cursor):
+        # FTS5 index over invoice headers and line descriptions, filled by
+        # triggers and rebuilt from the stored invoices
+        for name in ('trg_search_invoice_insert', 'trg_search_item_insert'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute('DROP TABLE IF EXISTS invoice_search')
+        try:
+            cursor.execute(f'''
+                CREATE VIRTUAL TABLE invoice_search USING fts5 (
+                    invoice_id UNINDEXED, {', '.join(SEARCH_COLUMNS)},
+                    prefix = '2 3'
+                )
+            ''')
         except sqlite3.OperationalError:
-            # Column already exists
-            pass
+            return  # SQLite built without FTS5; search() falls back to LIKE
 
-        self.conn.commit()
+        # The client address is copied at invoicing time, as printed on the PDF
+        cursor.execute('''
+            CREATE TRIGGER trg_search_invoice_insert
+            AFTER INSERT ON invoices
+            BEGIN
+                INSERT INTO invoice_search (invoice_id, client_company, client_address, reference, description)
+                VALUES (
+                    NEW.id, NEW.client_company,
+                    (SELECT address FROM clients WHERE name = NEW.client_company),
+                    NEW.reference, ''
+                );
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER trg_search_item_insert
+            AFTER INSERT ON invoice_items
+            BEGIN
+                INSERT INTO invoice_search (invoice_id, client_company, client_address, reference, description)
+                VALUES (NEW.invoice_id, '', '', '', NEW.description);
+            END
+        ''')
+        cursor.execute('''
+            INSERT INTO invoice_search (invoice_id, client_company, client_address, reference, description)
+            SELECT invoices.id, invoices.client_company, clients.address, invoices.reference, ''
+            FROM invoices LEFT JOIN clients ON clients.name = invoices.client_company
+        ''')
+        cursor.execute('''
+            INSERT INTO invoice_search (invoice_id, client_company, client_address, reference, description)
+            SELECT invoice_id, '', '', '', description FROM invoice_items
+        ''')
+
+    def _migrate_company_branding(self, cursor):
+        # Optional logo image and TTF font file per invoicing company
+        existing = self._column_names(cursor, 'invoicing_companies')
+        for column in ('logo_path', 'font_path'):
+            if column not in existing:
+                cursor.execute(f'ALTER TABLE invoicing_companies ADD COLUMN {column} TEXT')
+
+    def _migrate_total_index(self, cursor):
+        # Sorting a company's invoice history by amount
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_invoices_company_total
+            ON invoices (invoicing_company, grand_total_cents)
+        ''')
+
+    def _migrate_unique_invoice_numbers(self, cursor):
+        # One invoice per (company, number). Databases that already hold
+        # duplicates keep the plain index; add_invoice refuses new ones anyway
+        cursor.execute('''
+            SELECT 1 FROM invoices
+            GROUP BY invoicing_company, invoice_number
+            HAVING COUNT(*) > 1
+            LIMIT 1
+        ''')
+        if cursor.fetchone() is None:
+            cursor.execute('DROP INDEX IF EXISTS idx_invoices_company_number')
+            cursor.execute('''
+                CREATE UNIQUE INDEX idx_invoices_company_number
+                ON invoices (invoicing_company, invoice_number)
+            ''')
+
+    def _migrate_history_sort_indexes(self, cursor):
+        # Sorting a company's invoice history by the remaining columns, so
+        # every sortable heading reads its page from an index
+        for name, sort_key in (('id', 'id'), ('pdf', 'pdf_filename'), ('erroneous', 'is_erroneous')):
+            cursor.execute(f'''
+                CREATE INDEX IF NOT EXISTS idx_invoices_company_{name}
+                ON invoices (invoicing_company, {INVOICE_SORT_KEYS[sort_key]})
+            ''')
+
+    def _migrate_invoice_snapshot(self, cursor):
+        # Details printed on the invoice, see COMPANY_SNAPSHOT_COLUMNS
+        existing = self._column_names(cursor, 'invoices')
+        for column in COMPANY_SNAPSHOT_COLUMNS + CLIENT_SNAPSHOT_COLUMNS:
+            if column not in existing:
+                cursor.execute(f'ALTER TABLE invoices ADD COLUMN {column} TEXT')
+
+        # Index the stored address; older invoices fall back to the client row
+        cursor.execute('''
+            SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'invoice_search'
+        ''')
+        if cursor.fetchone() is None:
+            return
+        cursor.execute('DROP TRIGGER IF EXISTS trg_search_invoice_insert')
+        cursor.execute('''
+            CREATE TRIGGER trg_search_invoice_insert
+            AFTER INSERT ON invoices
+            BEGIN
+                INSERT INTO invoice_search (invoice_id, client_company, client_address, reference, description)
+                VALUES (
+                    NEW.id, NEW.client_company,
+                    COALESCE(NEW.client_address,
+                             (SELECT address FROM clients WHERE name = NEW.client_company)),
+                    NEW.reference, ''
+                );
+            END
+        ''')
+
+    # Applied in order; append new steps, never reorder or remove them
+    MIGRATIONS = (
+        _migrate_base_tables,
+        _migrate_invoice_indexes,
+        _migrate_invoice_items,
+        _migrate_cents_columns,
+        _migrate_revenue_tables,
+        _migrate_search_index,
+        _migrate_company_branding,
+        _migrate_total_index,
+        _migrate_unique_invoice_numbers,
+        _migrate_history_sort_indexes,
+        _migrate_invoice_snapshot,
+    )
 
     def add_invoicing_company(self, name, kvk, vat_nr, bank, iban, bic):
-        cursor = self.conn.cursor()
         try:
-            cursor.execute('''
-                INSERT INTO invoicing_companies (name, kvk, vat_nr, bank, iban, bic)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (name, kvk, vat_nr, bank, iban, bic))
-            self.conn.commit()
-            return True
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    INSERT INTO invoicing_companies (name, kvk, vat_nr, bank, iban, bic)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (name, kvk, vat_nr, bank, iban, bic))
         except sqlite3.IntegrityError:
             return False  # Company already exists
+        self._cache_added_names('company', ('companies',), [name])
+        return True
+
+    def add_invoicing_companies_bulk(self, companies):
+        """
+        Inserts many invoicing companies in a single transaction.
+
+        Parameters:
+            companies (iterable of tuple): (name, kvk, vat_nr, bank, iban, bic) rows.
+
+        Returns:
+            list of bool: One entry per input row, False where the company
+            already existed or was repeated in the batch.
+        """
+        companies = list(companies)
+        results = self._insert_bulk(
+            'invoicing_companies',
+            ('name', 'kvk', 'vat_nr', 'bank', 'iban', 'bic'),
+            ('name',),
+            companies
+        )
+        self._cache_added_names('company', ('companies',), [
+            company[0] for company, inserted in zip(companies, results) if inserted])
+        return results
 
     def get_invoicing_companies(self):
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT name FROM invoicing_companies')
-        return [row[0] for row in cursor.fetchall()]
+        return list(self._cached(('companies',), self._load_invoicing_companies))
+
+    def _load_invoicing_companies(self):
+        with self._reader() as cursor:
+            cursor.execute('SELECT name FROM invoicing_companies')
+            return [row[0] for row in cursor.fetchall()]
 
     def get_invoicing_company_details(self, name):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT kvk, vat_nr, bank, iban, bic FROM invoicing_companies
-            WHERE name = ?
-        ''', (name,))
-        return cursor.fetchone()
+        return self._cached(
+            ('company', name), lambda: self._load_invoicing_company_details(name))
+
+    def _load_invoicing_company_details(self, name):
+        with self._reader() as cursor:
+            cursor.execute('''
+                SELECT kvk, vat_nr, bank, iban, bic FROM invoicing_companies
+                WHERE name = ?
+            ''', (name,))
+            return cursor.fetchone()
+
+    def get_invoicing_company_branding(self, name):
+        """
+        Returns (logo_path, font_path) of an invoicing company, either of
+        which may be None, or None if the company does not exist.
+        """
+        return self._cached(
+            ('branding', name), lambda: self._load_invoicing_company_branding(name))
+
+    def _load_invoicing_company_branding(self, name):
+        with self._reader() as cursor:
+            cursor.execute('''
+                SELECT logo_path, font_path FROM invoicing_companies
+                WHERE name = ?
+            ''', (name,))
+            return cursor.fetchone()
 
     def add_client(self, name, address):
-        cursor = self.conn.cursor()
         try:
-            cursor.execute('''
-                INSERT INTO clients (name, address)
-                VALUES (?, ?)
-            ''', (name, address))
-            self.conn.commit()
-            return True
+            with self._transaction() as cursor:
+                cursor.execute('''
+                    INSERT INTO clients (name, address)
+                    VALUES (?, ?)
+                ''', (name, address))
         except sqlite3.IntegrityError:
             return False  # Client already exists
+        self._cache_added_names('client', ('clients',), [name])
+        return True
+
+    def add_clients_bulk(self, clients):
+        """
+        Inserts many clients in a single transaction.
+
+        Parameters:
+            clients (iterable of tuple): (name, address) rows.
+
+        Returns:
+            list of bool: One entry per input row, False where the client
+            already existed or was repeated in the batch.
+        """
+        clients = list(clients)
+        results = self._insert_bulk('clients', ('name', 'address'), ('name',), clients)
+        self._cache_added_names('client', ('clients',), [
+            client[0] for client, inserted in zip(clients, results) if inserted])
+        return results
 
     def get_clients(self):
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT name FROM clients')
-        return [row[0] for row in cursor.fetchall()]
+        return list(self._cached(('clients',), self._load_clients))
+
+    def _load_clients(self):
+        with self._reader() as cursor:
+            cursor.execute('SELECT name FROM clients')
+            return [row[0] for row in cursor.fetchall()]
 
     def get_client_details(self, name):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT address FROM clients
-            WHERE name = ?
-        ''', (name,))
-        return cursor.fetchone()
+        return self._cached(('client', name), lambda: self._load_client_details(name))
+
+    def _load_client_details(self, name):
+        with self._reader() as cursor:
+            cursor.execute('''
+                SELECT address FROM clients
+                WHERE name = ?
+            ''', (name,))
+            return cursor.fetchone()
         
-    def add_invoice(self, invoice_data):
-        cursor = self.conn.cursor()
+    def _reserve_invoice_numbers(self, cursor, company_name, count):
         cursor.execute('''
-            INSERT INTO invoices (
-                invoicing_company, client_company, invoice_number, invoice_date,
-                expiry_date, reference, total_exc, total_vat, grand_total,
-                vat_exempt, pdf_filename
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+            INSERT INTO invoice_sequences (invoicing_company, last_number)
+            VALUES (?, ?)
+            ON CONFLICT (invoicing_company)
+            DO UPDATE SET last_number = last_number + excluded.last_number
+        ''', (company_name, count))
+        cursor.execute('''
+            SELECT last_number FROM invoice_sequences
+            WHERE invoicing_company = ?
+        ''', (company_name,))
+        return cursor.fetchone()[0] - count + 1
+
+    def _advance_invoice_sequence(self, cursor, company_name, invoice_number):
+        cursor.execute('''
+            INSERT INTO invoice_sequences (invoicing_company, last_number)
+            VALUES (?, ?)
+            ON CONFLICT (invoicing_company)
+            DO UPDATE SET last_number = MAX(last_number, excluded.last_number)
+        ''', (company_name, invoice_number))
+
+    def allocate_invoice_numbers(self, company_name, count=1):
+        """
+        Atomically reserves `count` consecutive invoice numbers for a company.
+
+        Returns:
+            int: The first reserved number.
+        """
+        with self._transaction() as cursor:
+            return self._reserve_invoice_numbers(cursor, company_name, count)
+
+    def release_invoice_number(self, company_name, invoice_number):
+        """
+        Gives back a reserved number that was not used, so a cancelled or
+        failed invoice leaves no gap. Only possible while it is still the
+        last number of the sequence and no invoice carries it.
+
+        Returns:
+            bool: True if the number was released.
+        """
+        with self._transaction() as cursor:
+            cursor.execute('''
+                UPDATE invoice_sequences
+                SET last_number = last_number - 1
+                WHERE invoicing_company = ? AND last_number = ?
+                  AND NOT EXISTS (
+                      SELECT 1 FROM invoices
+                      WHERE invoicing_company = ? AND invoice_number = ?
+                  )
+            ''', (company_name, invoice_number, company_name, invoice_number))
+            return cursor.rowcount == 1
+
+    def _invoice_row(self, invoice_data, invoice_number):
+        return (
             invoice_data['invoicing_company'],
             invoice_data['client_company'],
-            invoice_data['invoice_number'],
+            invoice_number,
             invoice_data['invoice_date'],
             invoice_data['expiry_date'],
             invoice_data['reference'],
-            invoice_data['total_exc'],
-            invoice_data['total_vat'],
-            invoice_data['grand_total'],
+            *(float(to_decimal(invoice_data[column])) for column in INVOICE_MONEY_COLUMNS),
             int(invoice_data['vat_exempt']),
-            invoice_data['pdf_filename']
+            invoice_data['pdf_filename'],
+            *(to_cents(invoice_data[column]) for column in INVOICE_MONEY_COLUMNS),
+            *(invoice_data.get(column) for column in COMPANY_SNAPSHOT_COLUMNS + CLIENT_SNAPSHOT_COLUMNS)
+        )
+
+    def add_invoice(self, invoice_data):
+        """
+        Inserts an invoice and advances the company's invoice sequence in the
+        same transaction. If `invoice_number` is missing or None the next
+        number is allocated from the sequence. The company details (kvk,
+        vat_nr, bank, iban, bic) and client_address printed on the invoice
+        should be given too; they are stored with it for re-rendering.
+
+        Returns:
+            int or None: The id of the new invoice row, or None if the company
+            already has an invoice with the given number.
+        """
+        company_name = invoice_data['invoicing_company']
+        with self._transaction() as cursor:
+            invoice_number = invoice_data.get('invoice_number')
+            if invoice_number is None:
+                invoice_number = self._reserve_invoice_numbers(cursor, company_name, 1)
+            else:
+                invoice_number = int(invoice_number)
+                # The sequence update holds the write lock, so no other
+                # writer can take the number between this check and the insert
+                self._advance_invoice_sequence(cursor, company_name, invoice_number)
+                cursor.execute('''
+                    SELECT 1 FROM invoices
+                    WHERE invoicing_company = ? AND invoice_number = ?
+                ''', (company_name, invoice_number))
+                if cursor.fetchone() is not None:
+                    return None  # Company already has an invoice with this number
+            cursor.execute(f'''
+                INSERT INTO invoices ({', '.join(INVOICE_COLUMNS)})
+                VALUES ({', '.join('?' * len(INVOICE_COLUMNS))})
+            ''', self._invoice_row(invoice_data, invoice_number))
+            invoice_id = cursor.lastrowid
+            self._insert_items(cursor, [(invoice_id, invoice_data.get('items'))])
+            return invoice_id
+
+    def _insert_items(self, cursor, invoice_items):
+        # invoice_items yields (invoice_id, items) pairs; one executemany for all
+        cursor.executemany(f'''
+            INSERT INTO invoice_items (invoice_id, position, {', '.join(ITEM_COLUMNS)})
+            VALUES (?, ?, {', '.join('?' * len(ITEM_COLUMNS))})
+        ''', (
+            (
+                invoice_id,
+                position,
+                str(item['serial']),
+                item['description'],
+                float(item['hours']),
+                *(float(to_decimal(item[column])) for column in ITEM_MONEY_COLUMNS),
+                *(to_cents(item[column]) for column in ITEM_MONEY_COLUMNS)
+            )
+            for invoice_id, items in invoice_items
+            for position, item in enumerate(items or ())
         ))
-        self.conn.commit()
 
-    def get_invoices_by_company(self, company_name):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT invoice_number, invoice_date, client_company, grand_total, pdf_filename
-            FROM invoices WHERE invoicing_company = ?
-        ''', (company_name,))
-        return cursor.fetchall()
-        
+    def add_invoices_bulk(self, invoices):
+        """
+        Inserts many invoices, and their `items` when given, in a single
+        transaction. Invoices without an `invoice_number` get consecutive
+        numbers from their company's sequence.
+
+        Parameters:
+            invoices (iterable of dict): Invoice data as accepted by add_invoice.
+
+        Returns:
+            list of bool: One entry per input invoice, False where the
+            (invoicing_company, invoice_number) pair already existed or was
+            repeated in the batch.
+        """
+        invoices = list(invoices)
+        with self._transaction() as cursor:
+            if not cursor.connection.in_transaction:
+                cursor.execute('BEGIN IMMEDIATE')
+
+            # Allocate numbers for unnumbered invoices, one reservation per company
+            unnumbered = {}
+            for idx, invoice_data in enumerate(invoices):
+                if invoice_data.get('invoice_number') is None:
+                    unnumbered.setdefault(invoice_data['invoicing_company'], []).append(idx)
+            numbers = [invoice_data.get('invoice_number') for invoice_data in invoices]
+            for company_name, indexes in unnumbered.items():
+                first = self._reserve_invoice_numbers(cursor, company_name, len(indexes))
+                for offset, idx in enumerate(indexes):
+                    numbers[idx] = first + offset
+
+            rows = [
+                self._invoice_row(invoice_data, int(number))
+                for invoice_data, number in zip(invoices, numbers)
+            ]
+            results = self._insert_rows(
+                cursor, 'invoices', INVOICE_COLUMNS,
+                ('invoicing_company', 'invoice_number'), rows
+            )
+
+            # Advance each company's sequence past the highest inserted number
+            highest = {}
+            for row, inserted in zip(rows, results):
+                if inserted:
+                    highest[row[0]] = max(highest.get(row[0], 0), row[2])
+            for company_name, invoice_number in highest.items():
+                self._advance_invoice_sequence(cursor, company_name, invoice_number)
+
+            # Store line items, looking up the new invoice ids by their key
+            with_items = {
+                (row[0], row[2]): invoice_data['items']
+                for invoice_data, row, inserted in zip(invoices, rows, results)
+                if inserted and invoice_data.get('items')
+            }
+            found = list(self._select_by_keys(
+                cursor, 'invoices', ('invoicing_company', 'invoice_number'),
+                ('id', 'invoicing_company', 'invoice_number'), list(with_items)))
+            self._insert_items(cursor, (
+                (invoice_id, with_items[(company_name, invoice_number)])
+                for invoice_id, company_name, invoice_number in found
+            ))
+        return results
+
+    def _insert_bulk(self, table, columns, key_columns, rows):
+        with self._transaction() as cursor:
+            if not cursor.connection.in_transaction:
+                cursor.execute('BEGIN IMMEDIATE')
+            return self._insert_rows(cursor, table, columns, key_columns, list(rows))
+
+    def _select_by_keys(self, cursor, table, key_columns, select_columns, keys):
+        # Joining a VALUES list lets SQLite seek the key index once per key;
+        # a row-value IN (VALUES ...) would scan the whole index instead
+        placeholder = '(' + ', '.join('?' * len(key_columns)) + ')'
+        for start in range(0, len(keys), BULK_LOOKUP_CHUNK):
+            chunk = keys[start:start + BULK_LOOKUP_CHUNK]
+            cursor.execute(f'''
+                WITH keys ({', '.join(key_columns)}) AS (
+                    VALUES {', '.join([placeholder] * len(chunk))}
+                )
+                SELECT {', '.join(f'{table}.{column}' for column in select_columns)}
+                FROM keys JOIN {table}
+                ON {' AND '.join(f'{table}.{column} = keys.{column}' for column in key_columns)}
+            ''', [value for key in chunk for value in key])
+            yield from cursor.fetchall()
+
+    def _insert_rows(self, cursor, table, columns, key_columns, rows):
+        # Find keys that already exist, a chunk of rows per query
+        key_positions = [columns.index(column) for column in key_columns]
+        keys = [tuple(row[pos] for pos in key_positions) for row in rows]
+        existing = set(self._select_by_keys(cursor, table, key_columns, key_columns, keys))
+
+        results = []
+        to_insert = []
+        for key, row in zip(keys, rows):
+            if key in existing:
+                results.append(False)
+                continue
+            existing.add(key)
+            results.append(True)
+            to_insert.append(tuple(row))
+
+        cursor.executemany(f'''
+            INSERT INTO {table} ({', '.join(columns)})
+            VALUES ({', '.join('?' * len(columns))})
+        ''', to_insert)
+        return results
+
     def get_last_invoice_number(self, company_name):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT invoice_number FROM invoices
-            WHERE invoicing_company = ?
-            ORDER BY invoice_number DESC
-            LIMIT 1
-        ''', (company_name,))
-        result = cursor.fetchone()
-        return result[0] if result else 0  # Return 0 if no invoices exist
+        with self._reader() as cursor:
+            cursor.execute('''
+                SELECT last_number FROM invoice_sequences
+                WHERE invoicing_company = ?
+            ''', (company_name,))
+            result = cursor.fetchone()
+            return result[0] if result else 0  # Return 0 if no invoices exist
         
     def update_invoicing_company(self, name, kvk, vat_nr, bank, iban, bic):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            UPDATE invoicing_companies
-            SET kvk = ?, vat_nr = ?, bank = ?, iban = ?, bic = ?
-            WHERE name = ?
-        ''', (kvk, vat_nr, bank, iban, bic, name))
-        self.conn.commit()
+        with self._transaction() as cursor:
+            cursor.execute('''
+                UPDATE invoicing_companies
+                SET kvk = ?, vat_nr = ?, bank = ?, iban = ?, bic = ?
+                WHERE name = ?
+            ''', (kvk, vat_nr, bank, iban, bic, name))
+        self._invalidate(('company', name))
+
+    def update_invoicing_company_branding(self, name, logo_path, font_path):
+        with self._transaction() as cursor:
+            cursor.execute('''
+                UPDATE invoicing_companies
+                SET logo_path = ?, font_path = ?
+                WHERE name = ?
+            ''', (logo_path or None, font_path or None, name))
+        self._invalidate(('branding', name))
 
     def update_client(self, name, address):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            UPDATE clients
-            SET address = ?
-            WHERE name = ?
-        ''', (address, name))
-        self.conn.commit()
+        with self._transaction() as cursor:
+            cursor.execute('''
+                UPDATE clients
+                SET address = ?
+                WHERE name = ?
+            ''', (address, name))
+        self._invalidate(('client', name))
     def mark_invoice_as_erroneous(self, invoice_id):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            UPDATE invoices
-            SET is_erroneous = 1
-            WHERE id = ?
-        ''', (invoice_id,))
-        self.conn.commit()
+        self.mark_invoices_as_erroneous([invoice_id])
+
+    def mark_invoices_as_erroneous(self, invoice_ids):
+        """
+        Flags many invoices as erroneous in one transaction.
+
+        Returns:
+            int: Number of invoices whose flag changed.
+        """
+        return self._set_erroneous(invoice_ids, True)
+
+    def _set_erroneous(self, invoice_ids, erroneous):
+        # Rows that already have the flag are skipped, so the revenue
+        # triggers only run for real changes
+        flag = int(erroneous)
+        with self._transaction() as cursor:
+            cursor.executemany('''
+                UPDATE invoices
+                SET is_erroneous = ?
+                WHERE id = ? AND is_erroneous IS NOT ?
+            ''', ((flag, invoice_id, flag) for invoice_id in invoice_ids))
+            return cursor.rowcount
+
+    def get_invoice(self, invoice_id):
+        """
+        Returns an invoice row as a dict, including its stored line items
+        under 'items', or None if it does not exist. Amounts are Decimal.
+        """
+        with self._reader() as cursor:
+            cursor.execute(f'''
+                SELECT id, {', '.join(INVOICE_COLUMNS)}, is_erroneous
+                FROM invoices WHERE id = ?
+            ''', (invoice_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            invoice = dict(zip(('id',) + INVOICE_COLUMNS + ('is_erroneous',), row))
+        for column in INVOICE_MONEY_COLUMNS:
+            invoice[column] = from_cents(invoice.pop(f'{column}_cents'))
+        invoice['items'] = self.get_invoice_items(invoice_id)
+        return invoice
+
+    def get_invoice_items(self, invoice_id):
+        with self._reader() as cursor:
+            cursor.execute(f'''
+                SELECT serial, description, hours,
+                       {', '.join(f'{column}_cents' for column in ITEM_MONEY_COLUMNS)}
+                FROM invoice_items
+                WHERE invoice_id = ?
+                ORDER BY position
+            ''', (invoice_id,))
+            return [
+                {
+                    'serial': serial,
+                    'description': description,
+                    'hours': hours,
+                    **dict(zip(ITEM_MONEY_COLUMNS, map(from_cents, cents))),
+                }
+                for serial, description, hours, *cents in cursor.fetchall()
+            ]
+
     def get_invoices_by_company(self, company_name, include_erroneous=False):
-        cursor = self.conn.cursor()
-        query = '''
-            SELECT id, invoice_number, invoice_date, client_company, grand_total, pdf_filename, is_erroneous
+        return list(self.iter_invoices_by_company(
+            company_name, erroneous=None if include_erroneous else False))
+
+    def get_invoice_page(self, company_name, after=None, limit=INVOICE_PAGE_SIZE,
+                         client_company=None, date_from=None, date_to=None,
+                         erroneous=None, text=None, sort='invoice_date',
+                         descending=False):
+        """
+        Returns one page of a company's invoices ordered by (sort, id).
+
+        Parameters:
+            company_name (str): Invoicing company.
+            after (tuple): Key returned with the previous page, None for the first page.
+            limit (int): Maximum number of rows in the page.
+            client_company (str): Only invoices for this client.
+            date_from (str): Earliest invoice date (dd-mm-yyyy), inclusive.
+            date_to (str): Latest invoice date (dd-mm-yyyy), inclusive.
+            erroneous (bool): Only erroneous (True) or valid (False) invoices;
+                None returns both.
+            text (str): Only invoices whose client, reference or number
+                contains this text.
+            sort (str): One of INVOICE_SORT_KEYS.
+            descending (bool): Reverse the order.
+
+        Returns:
+            tuple: (rows, next_key). Rows are (id, invoice_number, invoice_date,
+            client_company, grand_total, pdf_filename, is_erroneous) with a
+            Decimal grand_total; next_key is None when there are no further pages.
+        """
+        if sort not in INVOICE_SORT_KEYS:
+            raise ValueError(f"Invalid sort key: {sort}")
+        sort_expr = INVOICE_SORT_KEYS[sort]
+        where, params = self._invoice_filters(
+            company_name, client_company, date_from, date_to, erroneous, text)
+        query = f'''
+            SELECT {sort_expr}, id, invoice_number, invoice_date, client_company,
+                   grand_total_cents, pdf_filename, is_erroneous
             FROM invoices
-            WHERE invoicing_company = ?
+            WHERE {where}
         '''
-        if not include_erroneous:
-            query += ' AND is_erroneous = 0'
+        direction, beyond = ('DESC', '<') if descending else ('ASC', '>')
+        if after is not None:
+            # Spelled out (not a row value) so SQLite can seek the index
+            query += f' AND {sort_expr} {beyond}= ? AND ({sort_expr} {beyond} ? OR id {beyond} ?)'
+            params.extend((after[0], after[0], after[1]))
+        query += f' ORDER BY {sort_expr} {direction}, id {direction} LIMIT ?'
+        params.append(limit)
+
+        with self._reader() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        next_key = None if len(rows) < limit else tuple(rows[-1][:2])
+        return [history_row(row[1:]) for row in rows], next_key
+
+    def _invoice_filters(self, company_name, client_company=None, date_from=None,
+                         date_to=None, erroneous=None, text=None):
+        where = 'invoicing_company = ?'
+        params = [company_name]
+        if client_company is not None:
+            where += ' AND client_company = ?'
+            params.append(client_company)
+        if date_from is not None:
+            where += f' AND {INVOICE_DATE_ISO} >= ?'
+            params.append(iso_date(date_from))
+        if date_to is not None:
+            where += f' AND {INVOICE_DATE_ISO} <= ?'
+            params.append(iso_date(date_to))
+        if erroneous is not None:
+            where += ' AND is_erroneous = ?'
+            params.append(int(erroneous))
+        if text:
+            pattern = '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            where += (" AND (client_company LIKE ? ESCAPE '\\' OR reference LIKE ? ESCAPE '\\'"
+                      " OR CAST(invoice_number AS TEXT) LIKE ? ESCAPE '\\')")
+            params.extend([pattern] * 3)
+        return where, params
+
+    def get_invoice_totals(self, company_name, client_company=None, date_from=None,
+                           date_to=None, erroneous=False, text=None):
+        """
+        Sums a company's invoices in SQL over the integer-cent columns.
+        Accepts the filters of get_invoice_page; erroneous invoices are
+        excluded by default.
+
+        Returns:
+            dict: 'invoice_count' and Decimal 'total_exc', 'total_vat' and
+            'grand_total'.
+        """
+        where, params = self._invoice_filters(
+            company_name, client_company, date_from, date_to, erroneous, text)
+        with self._reader() as cursor:
+            cursor.execute(f'''
+                SELECT COUNT(*), {', '.join(f'SUM({column}_cents)' for column in INVOICE_MONEY_COLUMNS)}
+                FROM invoices
+                WHERE {where}
+            ''', params)
+            count, *cents = cursor.fetchone()
+        return {
+            'invoice_count': count,
+            **dict(zip(INVOICE_MONEY_COLUMNS, map(from_cents, cents))),
+        }
+
+    def iter_invoices_by_company(self, company_name, page_size=INVOICE_PAGE_SIZE, **filters):
+        """
+        Yields a company's invoices page by page, so memory use does not
+        depend on the size of the history. Accepts the filters of get_invoice_page.
+        """
+        after = None
+        while True:
+            rows, after = self.get_invoice_page(
+                company_name, after=after, limit=page_size, **filters)
+            yield from rows
+            if after is None:
+                return
 
-        cursor.execute(query, (company_name,))
-        return cursor.fetchall()
-    
     def unmark_invoice_as_erroneous(self, invoice_id):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            UPDATE invoices
-            SET is_erroneous = 0
-            WHERE id = ?
-        ''', (invoice_id,))
-        self.conn.commit()
+        self.unmark_invoices_as_erroneous([invoice_id])
+
+    def unmark_invoices_as_erroneous(self, invoice_ids):
+        """
+        Clears the erroneous flag of many invoices in one transaction.
+
+        Returns:
+            int: Number of invoices whose flag changed.
+        """
+        return self._set_erroneous(invoice_ids, False)
+
+    def search(self, text, company_name=None, limit=SEARCH_LIMIT):
+        """
+        Full-text search over client names and addresses, references and
+        line item descriptions. Words match as prefixes, and all of them must
+        occur in the invoice's header fields or all in one of its line items.
+
+        Parameters:
+            text (str): Search words, e.g. "acme consult".
+            company_name (str): Only invoices of this invoicing company.
+            limit (int): Maximum number of results.
 
+        Returns:
+            list of tuple: Best matches first, as (id, invoice_number,
+            invoice_date, client_company, grand_total, pdf_filename,
+            is_erroneous) rows with a Decimal grand_total.
+        """
+        words = text.split()
+        if not words:
+            return []
+        where = []
+        params = []
+        if self.search_enabled:
+            # Quote each word so punctuation is not read as FTS5 query syntax
+            params.append(' '.join('"' + word.replace('"', '""') + '"*' for word in words))
+            query = '''
+                SELECT invoices.id, invoice_number, invoice_date, client_company,
+                       grand_total_cents, pdf_filename, is_erroneous
+                FROM (
+                    SELECT invoice_id, MIN(rank) AS score
+                    FROM invoice_search
+                    WHERE invoice_search MATCH ?
+                    GROUP BY invoice_id
+                ) AS matches
+                JOIN invoices ON invoices.id = matches.invoice_id
+            '''
+            order = 'matches.score, invoices.id'
+        else:
+            query = '''
+                SELECT id, invoice_number, invoice_date, client_company,
+                       grand_total_cents, pdf_filename, is_erroneous
+                FROM invoices
+            '''
+            for word in words:
+                where.append('(client_company LIKE ? OR reference LIKE ?)')
+                params.extend([f'%{word}%'] * 2)
+            order = 'id DESC'
+        if company_name is not None:
+            where.append('invoicing_company = ?')
+            params.append(company_name)
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        query += f' ORDER BY {order} LIMIT ?'
+        params.append(limit)
+        with self._reader() as cursor:
+            cursor.execute(query, params)
+            return [history_row(row) for row in cursor.fetchall()]
+
+    def get_revenue_by_company(self):
+        """
+        Returns (invoicing_company, invoice_count, total_exc, total_vat,
+        grand_total) rows with Decimal amounts, excluding erroneous invoices.
+        """
+        with self._reader() as cursor:
+            cursor.execute(f'''
+                SELECT invoicing_company, {', '.join(REVENUE_COLUMNS)}
+                FROM revenue_by_company
+                ORDER BY invoicing_company
+            ''')
+            return self._revenue_rows(cursor.fetchall())
+
+    def get_revenue_by_client(self, company_name):
+        """
+        Returns (client_company, invoice_count, total_exc, total_vat,
+        grand_total) rows for a company with Decimal amounts, excluding
+        erroneous invoices.
+        """
+        with self._reader() as cursor:
+            cursor.execute(f'''
+                SELECT client_company, {', '.join(REVENUE_COLUMNS)}
+                FROM revenue_by_client
+                WHERE invoicing_company = ?
+                ORDER BY client_company
+            ''', (company_name,))
+            return self._revenue_rows(cursor.fetchall())
+
+    def get_revenue_by_month(self, company_name, month_from=None, month_to=None):
+        """
+        Returns (month, invoice_count, total_exc, total_vat, grand_total) rows
+        for a company with Decimal amounts, excluding erroneous invoices.
+        Months are yyyy-mm strings; month_from and month_to are inclusive bounds.
+        """
+        query = f'''
+            SELECT month, {', '.join(REVENUE_COLUMNS)}
+            FROM revenue_by_month
+            WHERE invoicing_company = ?
+        '''
+        params = [company_name]
+        if month_from is not None:
+            query += ' AND month >= ?'
+            params.append(month_from)
+        if month_to is not None:
+            query += ' AND month <= ?'
+            params.append(month_to)
+        query += ' ORDER BY month'
+        with self._reader() as cursor:
+            cursor.execute(query, params)
+            return self._revenue_rows(cursor.fetchall())
 
-    
+    def _revenue_rows(self, rows):
+        # Cent sums to Decimal amounts; one conversion per group
+        return [(key, count, *map(from_cents, cents)) for key, count, *cents in rows]
 
     def close(self):
+        for reader in self.reader_conns:
+            reader.close()
         self.conn.close()
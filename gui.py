@@ -1,14 +1,26 @@
 # gui.py
 
+import logging
+import os
+import queue
+import threading
 import tkinter as tk
-from tkinter import messagebox, ttk, simpledialog
+from tkinter import filedialog, messagebox, ttk, simpledialog
 from datetime import datetime, timedelta
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 
 from database import Database
-from utils import is_float
-from invoice import create_invoice_pdf
+from utils import calculate_totals, format_money, is_float, to_decimal
+from invoice import create_invoice_pdf, load_logo, register_font
+from history_window import InvoiceHistoryWindow
+from item_grid import COLUMNS as ITEM_COLUMNS, ItemGrid
+
+# Milliseconds between checks for messages from the generate worker
+POLL_INTERVAL_MS = 100
+
+# Milliseconds of editing pause before the totals label is redrawn
+TOTALS_DELAY_MS = 150
 
 class InvoiceApp:
     def __init__(self, master):
@@ -20,8 +32,11 @@ class InvoiceApp:
         # Initialize Database
         self.db = Database()
 
-        # Initialize Serial Number Counter
-        self.serial_number = 1
+        # Background invoice generation: the worker thread posts
+        # (kind, payload) messages that the Tk thread polls with after()
+        self.generate_queue = queue.Queue()
+        self.generate_thread = None
+        self.generate_cancelled = threading.Event()
 
         # Scrollable Frame
         self.canvas = ttk.Canvas(master)
@@ -209,73 +224,76 @@ class InvoiceApp:
         # ----- Items Section -----
 
 
-        # Table Headers
-        column_widths = [12, 40, 10, 12, 10, 12, 10]
-        headers = [
-            "Serial Number",
-            "Description",
-            "Hours",
-            "Price Exc.",
-            "VAT",
-            "Total"
-        ]
-        
         ttk.Label(
             self.frame, text="Items", font=("Arial", 14, "bold"), bootstyle=PRIMARY
         ).grid(row=13, column=0, columnspan=7, pady=15)
 
-        # Define column widths and configure grid
-        self.frame.grid_columnconfigure(list(range(len(headers))), weight=1)
-        
-        header_frame = ttk.Frame(self.frame, bootstyle=SECONDARY)
-        header_frame.grid(row=14, column=0, columnspan=len(headers), sticky="nsew")
-
-        for idx, (header, width) in enumerate(zip(headers, column_widths)):
-            ttk.Label(
-                header_frame,
-                text=header,
-                width=width,
-                bootstyle=INFO,
-                anchor="center"
-            ).grid(row=0, column=idx, padx=5, pady=5, sticky="ew")
-
-        # Items section
-        self.items_frame = ttk.Frame(self.frame, bootstyle=SECONDARY)
-        self.items_frame.grid(
+        self.frame.grid_columnconfigure(list(range(len(ITEM_COLUMNS))), weight=1)
+
+        # Items grid; only the visible rows have widgets
+        self.totals_job = None
+        self.item_grid = ItemGrid(
+            self.frame,
+            hourly_rate=self.hourly_rate_var.get,
+            on_change=self.schedule_totals_update
+        )
+        self.item_grid.grid(
             row=15,
             column=0,
-            columnspan=len(headers),
+            columnspan=len(ITEM_COLUMNS) + 1,
             padx=5,
             pady=5,
             sticky="nsew"
         )
-
-        # Configure columns for items_frame
-        for idx in range(len(headers)):
-            self.items_frame.grid_columnconfigure(idx, weight=1)
-
-        self.items = []
         self.add_item_row()
 
+        item_button_frame = ttk.Frame(self.frame)
+        item_button_frame.grid(row=16, column=0, columnspan=7, pady=10)
+
         ttk.Button(
-            self.frame,
+            item_button_frame,
             text="Add Item",
             command=self.add_item_row,
             bootstyle=(PRIMARY, OUTLINE)
-        ).grid(row=16, column=0, columnspan=7, pady=10)
+        ).pack(side="left", padx=10)
+
+        ttk.Button(
+            item_button_frame,
+            text="Delete Selected",
+            command=self.delete_selected_rows,
+            bootstyle=(DANGER, OUTLINE)
+        ).pack(side="left", padx=10)
+
+        # Running invoice totals, kept up to date by the items grid
+        self.totals_label = ttk.Label(
+            item_button_frame, text="", font=("Arial", 12, "bold"), bootstyle=PRIMARY
+        )
+        self.totals_label.pack(side="left", padx=20)
+        self.update_totals()
 
 
         # ----- Generate, Refresh, and View Invoices Buttons -----
         button_frame = ttk.Frame(self.frame, bootstyle=DARK)
         button_frame.grid(row=17, column=0, columnspan=7, pady=20)
 
-        ttk.Button(
+        self.generate_button = ttk.Button(
             button_frame,
             text="Generate Invoice",
             command=self.generate_invoice,
             bootstyle=(SUCCESS, OUTLINE),
             width=20
-        ).pack(side="left", padx=10)
+        )
+        self.generate_button.pack(side="left", padx=10)
+
+        self.cancel_button = ttk.Button(
+            button_frame,
+            text="Cancel",
+            command=self.cancel_generation,
+            bootstyle=(DANGER, OUTLINE),
+            width=10,
+            state="disabled"
+        )
+        self.cancel_button.pack(side="left", padx=10)
 
         ttk.Button(
             button_frame,
@@ -293,6 +311,17 @@ class InvoiceApp:
             width=20
         ).pack(side="left", padx=10)
 
+        # Progress of the running generation, hidden while idle
+        self.progress_frame = ttk.Frame(self.frame)
+        self.progress_frame.grid(row=18, column=0, columnspan=7, pady=5)
+        self.progress_bar = ttk.Progressbar(
+            self.progress_frame,
+            mode="indeterminate",
+            length=300,
+            bootstyle=SUCCESS
+        )
+        self.progress_label = ttk.Label(self.progress_frame, text="")
+
         # Adjustments for aesthetics
         self.master.update()
 
@@ -387,6 +416,7 @@ class InvoiceApp:
             return
 
         kvk, vat_nr, bank, iban, bic = details
+        logo_path, font_path = self.db.get_invoicing_company_branding(company_name) or (None, None)
 
         # Create popup dialog
         dialog = tk.Toplevel(self.master)
@@ -417,6 +447,33 @@ class InvoiceApp:
         bic_entry.insert(0, bic)
         bic_entry.grid(row=4, column=1, padx=5, pady=5)
 
+        # Optional branding files
+        def browse(entry, title, filetypes):
+            path = filedialog.askopenfilename(parent=dialog, title=title, filetypes=filetypes)
+            if path:
+                entry.delete(0, tk.END)
+                entry.insert(0, path)
+
+        ttk.Label(dialog, text="Logo:").grid(row=5, column=0, padx=5, pady=5, sticky="e")
+        logo_entry = ttk.Entry(dialog, width=50)
+        logo_entry.insert(0, logo_path or "")
+        logo_entry.grid(row=5, column=1, padx=5, pady=5)
+        ttk.Button(
+            dialog, text="Browse", bootstyle=(SECONDARY, OUTLINE),
+            command=lambda: browse(logo_entry, "Select Logo",
+                                   [("Images", "*.png *.jpg *.jpeg *.gif"), ("All files", "*.*")]),
+        ).grid(row=5, column=2, padx=5, pady=5)
+
+        ttk.Label(dialog, text="Font (TTF):").grid(row=6, column=0, padx=5, pady=5, sticky="e")
+        font_entry = ttk.Entry(dialog, width=50)
+        font_entry.insert(0, font_path or "")
+        font_entry.grid(row=6, column=1, padx=5, pady=5)
+        ttk.Button(
+            dialog, text="Browse", bootstyle=(SECONDARY, OUTLINE),
+            command=lambda: browse(font_entry, "Select Font",
+                                   [("TrueType fonts", "*.ttf"), ("All files", "*.*")]),
+        ).grid(row=6, column=2, padx=5, pady=5)
+
         def save_changes():
             new_kvk = kvk_entry.get().strip()
             new_vat_nr = vat_nr_entry.get().strip()
@@ -428,12 +485,33 @@ class InvoiceApp:
                 messagebox.showerror("Error", "All fields are required.")
                 return
 
+            # Load the branding files now, so a bad file is not saved and
+            # does not break every later invoice of the company
+            new_logo = logo_entry.get().strip()
+            new_font = font_entry.get().strip()
+            branding = (
+                (new_logo, "Logo", load_logo, "is not a supported image"),
+                (new_font, "Font", register_font, "is not a TrueType (TTF) font"),
+            )
+            for path, kind, load, problem in branding:
+                if not path:
+                    continue
+                if not os.path.isfile(path):
+                    messagebox.showerror("Error", f"{kind} file not found: {path}")
+                    return
+                try:
+                    load(path)
+                except Exception:
+                    messagebox.showerror("Error", f"{kind} file {path} {problem}.")
+                    return
+
             self.db.update_invoicing_company(company_name, new_kvk, new_vat_nr, new_bank, new_iban, new_bic)
+            self.db.update_invoicing_company_branding(company_name, new_logo, new_font)
             messagebox.showinfo("Success", f"Details for {company_name} updated successfully.")
             dialog.destroy()
 
         ttk.Button(dialog, text="Save Changes", command=save_changes, bootstyle=(SUCCESS, OUTLINE)).grid(
-            row=5, column=0, columnspan=2, pady=10
+            row=7, column=0, columnspan=3, pady=10
         )
 
 
@@ -490,166 +568,46 @@ class InvoiceApp:
 
     # Function to calculate Total = Price Exc. + VAT
     def add_item_row(self):
-        row = len(self.items)
-        column_widths = [12, 40, 10, 12, 10, 12, 10]
-        padding = {"padx": 1, "pady": 1}
-
-        serial_label = tk.Label(
-            self.items_frame,
-            text=str(self.serial_number),
-            width=column_widths[0],
-            borderwidth=1,
-            relief="solid",
-            anchor="center"
-        )
-        description = tk.Entry(self.items_frame, width=column_widths[1])
-        hours = tk.Entry(self.items_frame, width=column_widths[2])
-        price_exc = tk.Entry(self.items_frame, width=column_widths[3])
-        vat = tk.Entry(self.items_frame, width=column_widths[4])
-        total = tk.Entry(self.items_frame, width=column_widths[5], state="readonly")
-        delete_button = tk.Button(
-            self.items_frame,
-            text="Delete",
-            command=lambda: self.delete_item_row(row),
-            width=column_widths[6],
-            bg="red",
-            fg="white"
-        )
-
-        serial_label.grid(row=row, column=0, **padding)
-        description.grid(row=row, column=1, **padding)
-        hours.grid(row=row, column=2, **padding)
-        price_exc.grid(row=row, column=3, **padding)
-        vat.grid(row=row, column=4, **padding)
-        total.grid(row=row, column=5, **padding)
-        delete_button.grid(row=row, column=6, **padding)
-
-        # Function to calculate "Price Exc." dynamically based on hours and hourly rate
-        def calculate_price_exc(event=None):
-            try:
-                hr_rate = self.hourly_rate_var.get()  # Get the hourly rate
-                hrs = float(hours.get()) if hours.get() else 0.0
-                # Automatically update price_exc if it is empty or zero
-                price_exc.delete(0, tk.END)
-                price_exc.insert(0, f"{hr_rate * hrs:.2f}")
-                calculate_total()  # Update the total
-            except ValueError:
-                pass  # Ignore invalid inputs
-
-        # Function to calculate the total
-        def calculate_total(event=None):
-            try:
-                exc = float(price_exc.get()) if price_exc.get() else 0.0
-                vat_val = float(vat.get()) if vat.get() else 0.0
-                total_val = exc + vat_val
-                total.config(state="normal")
-                total.delete(0, tk.END)
-                total.insert(0, f"{total_val:.2f}")
-                total.config(state="readonly")
-            except ValueError:
-                total.config(state="normal")
-                total.delete(0, tk.END)
-                total.insert(0, "0.00")
-                total.config(state="readonly")
-
-        # Bind events to dynamically calculate values
-        hours.bind("<FocusOut>", calculate_price_exc)
-        price_exc.bind("<FocusOut>", calculate_total)
-        vat.bind("<FocusOut>", calculate_total)
-
-        self.items.append(
-            {
-                "serial": serial_label,
-                "description": description,
-                "hours": hours,
-                "price_exc": price_exc,
-                "vat": vat,
-                "total": total,
-                "delete_button": delete_button
-            }
+        self.item_grid.add_item()
+
+    def schedule_totals_update(self):
+        # Redraw once typing pauses instead of on every keystroke
+        if self.totals_job is not None:
+            self.master.after_cancel(self.totals_job)
+        self.totals_job = self.master.after(TOTALS_DELAY_MS, self.update_totals)
+
+    def update_totals(self):
+        self.totals_job = None
+        totals = self.item_grid.totals()
+        self.totals_label.config(
+            text=f"Total Exc.: {format_money(totals['total_exc'])}   "
+                 f"VAT: {format_money(totals['total_vat'])}   "
+                 f"Grand Total: {format_money(totals['grand_total'])}"
         )
-        self.serial_number += 1
-
 
-    def delete_item_row(self, row):
-        if not self.items:
+    def delete_selected_rows(self):
+        if not self.item_grid.selected:
+            messagebox.showerror("Error", "Please select items by clicking their serial numbers.")
             return
-        # Remove widgets
-        item = self.items.pop(row)
-        item["serial"].destroy()
-        item["description"].destroy()
-        item["hours"].destroy()
-        item["price_exc"].destroy()
-        item["vat"].destroy()
-        item["total"].destroy()
-        item["delete_button"].destroy()
-
-        # Update serial numbers and row indices
-        for idx, itm in enumerate(self.items):
-            itm["serial"].config(text=str(idx + 1))
-            itm["delete_button"].config(
-                command=lambda idx=idx: self.delete_item_row(idx)
-            )
-
-        # Reset serial number counter
-        self.serial_number = len(self.items) + 1
+        self.item_grid.delete_selected()
 
     # ----- VAT Exemption Toggle -----
 
     def toggle_vat_exemption(self):
-        if self.vat_exempt.get():
-            # Set VAT to zero and disable VAT entries
-            for item in self.items:
-                item["vat"].delete(0, tk.END)
-                item["vat"].insert(0, "0.00")
-                item["vat"].config(state="readonly")
-                # Recalculate total
-                item["total"].config(state="normal")
-                item["total"].delete(0, tk.END)
-                try:
-                    exc = float(item["price_exc"].get()) if item["price_exc"].get() else 0.0
-                except ValueError:
-                    exc = 0.0
-                total_val = exc + 0.0
-                item["total"].insert(0, f"{total_val:.2f}")
-                item["total"].config(state="readonly")
-        else:
-            # Enable VAT entries
-            for item in self.items:
-                item["vat"].config(state="normal")
-                # Optionally clear VAT fields or keep previous values
-                if item["vat"].get() == "0.00":
-                    item["vat"].delete(0, tk.END)
-                    item["vat"].insert(0, "")
-                # Recalculate total if VAT was previously zero
-                item["total"].config(state="normal")
-                item["total"].delete(0, tk.END)
-                try:
-                    exc = float(item["price_exc"].get()) if item["price_exc"].get() else 0.0
-                    vat_val = float(item["vat"].get()) if item["vat"].get() else 0.0
-                except ValueError:
-                    exc = vat_val = 0.0
-                total_val = exc + vat_val
-                item["total"].insert(0, f"{total_val:.2f}")
-                item["total"].config(state="readonly")
+        self.item_grid.set_vat_exempt(self.vat_exempt.get())
 
     # ----- Invoice Generation -----
 
     def generate_invoice(self):
+        if self.generate_thread is not None:
+            return  # A generation is already running
+
         try:
             # Collect data
             invoicing_company = self.invoicing_company_var.get().strip()
             if not invoicing_company:
                 raise ValueError("Please select an Invoicing Company.")
 
-            # Get the last invoice number and increment
-            last_invoice_number = self.db.get_last_invoice_number(invoicing_company)
-            next_invoice_number = last_invoice_number + 1
-
-            # Automatically set the invoice number
-            self.invoice_number_entry.delete(0, tk.END)
-            self.invoice_number_entry.insert(0, str(next_invoice_number))
-
             client_company = self.client_company_var.get().strip()
             if not client_company:
                 raise ValueError("Please select a Client Company.")
@@ -662,13 +620,12 @@ class InvoiceApp:
 
             client_address = self.client_address_entry.get().strip()
 
-            invoice_number = self.invoice_number_entry.get().strip()
             invoice_date = self.invoice_date_entry.get().strip()
             expiry_date = self.expiry_date_entry.get().strip()
             reference = self.reference_entry.get().strip()
             vat_exempt = self.vat_exempt.get()
 
-            # Validate required fields
+            # Validate required fields; the invoice number is assigned by the worker
             required_fields = [
                 invoicing_company,
                 kvk,
@@ -678,7 +635,6 @@ class InvoiceApp:
                 bic,
                 client_company,
                 client_address,
-                invoice_number,
                 invoice_date,
                 expiry_date,
             ]
@@ -693,28 +649,28 @@ class InvoiceApp:
                 raise ValueError("Please enter dates in the format dd-mm-yyyy.")
 
             # Collect items
+            self.item_grid.commit_edit()
             items = []
-            for idx, item in enumerate(self.items, start=1):
-                description = item["description"].get().strip()
-                hours_str = item["hours"].get().strip()
-                price_exc_str = item["price_exc"].get().strip()
-                vat_str = item["vat"].get().strip()
-                total_str = item["total"].get().strip()
+            for idx, item in enumerate(self.item_grid.items, start=1):
+                description = item["description"].strip()
+                hours_str = item["hours"].strip()
+                price_exc_str = item["price_exc"].strip()
+                vat_str = item["vat"].strip()
 
                 if not all([description, hours_str, price_exc_str, vat_str]):
                     continue  # Skip incomplete rows
 
                 try:
                     hours = float(hours_str)
-                    price_exc = float(price_exc_str)
-                    vat_val = float(vat_str)
-                    total = float(total_str)
+                    price_exc = to_decimal(price_exc_str)
+                    vat_val = to_decimal(vat_str)
+                    total = price_exc + vat_val
                 except ValueError:
                     raise ValueError(f"Invalid numeric value in item {idx}.")
 
                 items.append(
                     {
-                        "serial": item["serial"].cget("text"),
+                        "serial": str(idx),
                         "description": description,
                         "hours": hours,
                         "price_exc": price_exc,
@@ -726,60 +682,180 @@ class InvoiceApp:
             if not items:
                 raise ValueError("Please add at least one valid item.")
 
-            # Calculate totals
-            total_exc = sum(item["price_exc"] for item in items)
-            total_vat = sum(item["vat"] for item in items) if not vat_exempt else 0.0
-            grand_total = total_exc + total_vat
-            
-                        # Create PDF using invoice.py
+        except Exception as e:
+            messagebox.showerror("Error", f"An error occurred: {e}")
+            return
+
+        # Arguments for create_invoice_pdf; the worker fills in the number,
+        # file name and branding
+        invoice = {
+            'invoicing_company': invoicing_company,
+            'kvk': kvk,
+            'vat_nr': vat_nr,
+            'bank': bank,
+            'iban': iban,
+            'bic': bic,
+            'client_company': client_company,
+            'client_address': client_address,
+            'invoice_date': invoice_date,
+            'expiry_date': expiry_date,
+            'reference': reference,
+            'items': items,
+            'vat_exempt': bool(vat_exempt),
+            **calculate_totals(items, vat_exempt),
+        }
+
+        self.generate_cancelled.clear()
+        self.generate_thread = threading.Thread(
+            target=self.run_generate_job, args=(invoice,), daemon=True
+        )
+        self.set_generating(True)
+        self.generate_thread.start()
+        self.master.after(POLL_INTERVAL_MS, self.poll_generate_job)
+
+    def run_generate_job(self, invoice):
+        """
+        Renders and stores an invoice. Runs in the worker thread, so it only
+        talks to the Tk thread through generate_queue.
+        """
+        post = self.generate_queue.put
+        invoicing_company = invoice['invoicing_company']
+        invoice_number = None
+        stored = False
+        try:
+            if self.generate_cancelled.is_set():
+                post(("cancelled", None))
+                return
+            post(("status", "Assigning invoice number..."))
+            # Reserved in the sequence, so no other writer can take the number
+            invoice_number = self.db.allocate_invoice_numbers(invoicing_company, 1)
             pdf_filename = f"Invoice_{invoice_number}.pdf"
+            logo, font = self.db.get_invoicing_company_branding(invoicing_company) or (None, None)
+            post(("number", invoice_number))
 
+            post(("status", f"Rendering {pdf_filename}..."))
             create_invoice_pdf(
                 pdf_filename=pdf_filename,
-                invoicing_company=invoicing_company,
-                kvk=kvk,
-                vat_nr=vat_nr,
-                bank=bank,
-                iban=iban,
-                bic=bic,
-                client_company=client_company,
-                client_address=client_address,
-                invoice_number=invoice_number,
-                invoice_date=invoice_date,
-                expiry_date=expiry_date,
-                reference=reference,
-                items=items,
-                total_exc=total_exc,
-                total_vat=total_vat,
-                grand_total=grand_total,
-                vat_exempt=bool(vat_exempt)
+                invoice_number=str(invoice_number),
+                logo=logo,
+                font=font,
+                **invoice
             )
-            
+            if self.generate_cancelled.is_set():
+                # Nothing was stored yet; drop the rendered file
+                os.remove(pdf_filename)
+                post(("cancelled", None))
+                return
+
             # Save invoice to the database
+            post(("status", "Saving to database..."))
             invoice_data = {
                 'invoicing_company': invoicing_company,
-                'client_company': client_company,
-                'invoice_number': next_invoice_number,
-                'invoice_date': invoice_date,
-                'expiry_date': expiry_date,
-                'reference': reference,
-                'total_exc': total_exc,
-                'total_vat': total_vat,
-                'grand_total': grand_total,
-                'vat_exempt': vat_exempt,
-                'pdf_filename': pdf_filename
+                'client_company': invoice['client_company'],
+                'invoice_number': invoice_number,
+                'invoice_date': invoice['invoice_date'],
+                'expiry_date': invoice['expiry_date'],
+                'reference': invoice['reference'],
+                'total_exc': invoice['total_exc'],
+                'total_vat': invoice['total_vat'],
+                'grand_total': invoice['grand_total'],
+                'vat_exempt': invoice['vat_exempt'],
+                'pdf_filename': pdf_filename,
+                'items': invoice['items'],
+                # As printed, so the invoice can be re-rendered unchanged
+                'kvk': invoice['kvk'],
+                'vat_nr': invoice['vat_nr'],
+                'bank': invoice['bank'],
+                'iban': invoice['iban'],
+                'bic': invoice['bic'],
+                'client_address': invoice['client_address'],
             }
-            self.db.add_invoice(invoice_data)            
+            if self.db.add_invoice(invoice_data) is None:
+                os.remove(pdf_filename)
+                raise ValueError(
+                    f"Invoice number {invoice_number} of {invoicing_company} is already in use. "
+                    "Please generate the invoice again."
+                )
+            stored = True
+            post(("done", pdf_filename))
+        except Exception as e:
+            post(("error", e))
+        finally:
+            # Give the number back unless a later one was reserved meanwhile
+            if invoice_number is not None and not stored and not self._release_number(
+                    invoicing_company, invoice_number):
+                logging.error("Invoice number %s of %s was reserved but not stored",
+                              invoice_number, invoicing_company)
+
+    def _release_number(self, invoicing_company, invoice_number):
+        try:
+            return self.db.release_invoice_number(invoicing_company, invoice_number)
+        except Exception:
+            logging.error("Error releasing invoice number %s of %s", invoice_number,
+                          invoicing_company, exc_info=True)
+            return False
 
+    def poll_generate_job(self):
+        """
+        Handles the worker's messages on the Tk thread and keeps polling
+        until the job has finished.
+        """
+        finished = None
+        while True:
+            try:
+                kind, payload = self.generate_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "status":
+                self.progress_label.config(text=payload)
+            elif kind == "number":
+                self.invoice_number_entry.delete(0, tk.END)
+                self.invoice_number_entry.insert(0, str(payload))
+            else:
+                finished = (kind, payload)
+
+        if finished is None:
+            self.master.after(POLL_INTERVAL_MS, self.poll_generate_job)
+            return
+
+        self.generate_thread = None
+        self.set_generating(False)
+        kind, payload = finished
+        if kind == "done":
             messagebox.showinfo(
-                "Success", f"{pdf_filename} has been generated and saved to database."
+                "Success", f"{payload} has been generated and saved to database."
             )
             self.refresh_form()
-            
-           
+        elif kind == "error":
+            messagebox.showerror("Error", f"An error occurred: {payload}")
+        else:
+            messagebox.showinfo("Cancelled", "Invoice generation was cancelled.")
 
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {e}")
+    def cancel_generation(self):
+        """
+        Asks the running job to stop. Rendering is not interrupted; the job
+        stops before the next step and nothing is saved.
+        """
+        if self.generate_thread is not None:
+            self.generate_cancelled.set()
+            self.cancel_button.config(state="disabled")
+            self.progress_label.config(text="Cancelling...")
+
+    def set_generating(self, running):
+        # Disables Generate and shows the progress indicator while a job runs
+        if running:
+            self.generate_button.config(state="disabled")
+            self.cancel_button.config(state="normal")
+            self.progress_bar.pack(side="left", padx=10)
+            self.progress_label.pack(side="left", padx=10)
+            self.progress_bar.start()
+        else:
+            self.progress_bar.stop()
+            self.progress_bar.pack_forget()
+            self.progress_label.pack_forget()
+            self.progress_label.config(text="")
+            self.generate_button.config(state="normal")
+            self.cancel_button.config(state="disabled")
 
     # ----- Invoice History Viewer -----
     def view_invoices(self):
@@ -788,83 +864,14 @@ class InvoiceApp:
             messagebox.showerror("Error", "Please select an invoicing company.")
             return
 
-        invoices = self.db.get_invoices_by_company(company_name, include_erroneous=True)
-        if not invoices:
+        # One row is enough to know; the window runs the COUNT itself
+        rows, _ = self.db.get_invoice_page(company_name, limit=1)
+        if not rows:
             messagebox.showinfo("Info", f"No invoices found for {company_name}.")
             return
 
-        # Create a new window to display invoices
-        invoice_window = tk.Toplevel(self.master)
-        invoice_window.title(f"Invoices for {company_name}")
-        invoice_window.geometry("800x600")
-
-        # Add a treeview to display invoices
-        tree = ttk.Treeview(
-            invoice_window,
-            columns=("Invoice ID", "Invoice Number", "Date", "Client", "Total", "PDF File", "Erroneous"),
-            show="headings"
-        )
-        tree.heading("Invoice ID", text="Invoice ID")
-        tree.heading("Invoice Number", text="Invoice Number")
-        tree.heading("Date", text="Date")
-        tree.heading("Client", text="Client")
-        tree.heading("Total", text="Total (€)")
-        tree.heading("PDF File", text="PDF File")
-        tree.heading("Erroneous", text="Erroneous")
-
-        for invoice in invoices:
-            is_erroneous = "Yes" if invoice[6] else "No"
-            tree.insert("", "end", values=invoice[:6] + (is_erroneous,))
-
-        tree.pack(fill="both", expand=True)
-
-        # Function to mark an invoice as erroneous
-        def mark_as_erroneous():
-            selected_item = tree.selection()
-            if not selected_item:
-                messagebox.showerror("Error", "Please select an invoice to mark as erroneous.")
-                return
-
-            invoice_id = tree.item(selected_item[0], "values")[0]
-            self.db.mark_invoice_as_erroneous(invoice_id)
-            messagebox.showinfo("Success", "Invoice marked as erroneous.")
-            invoice_window.destroy()
-            self.view_invoices()  # Refresh the view
-
-        # Function to unmark an invoice as erroneous
-        def unmark_as_erroneous():
-            selected_item = tree.selection()
-            if not selected_item:
-                messagebox.showerror("Error", "Please select an invoice to unmark as erroneous.")
-                return
-
-            invoice_id = tree.item(selected_item[0], "values")[0]
-            self.db.unmark_invoice_as_erroneous(invoice_id)
-            messagebox.showinfo("Success", "Invoice unmarked as erroneous.")
-            invoice_window.destroy()
-            self.view_invoices()  # Refresh the view
-
-        # Add buttons for marking and unmarking erroneous invoices
-        button_frame = ttk.Frame(invoice_window)
-        button_frame.pack(pady=10)
-
-        ttk.Button(
-            button_frame,
-            text="Mark as Erroneous",
-            command=mark_as_erroneous,
-            bootstyle=(DANGER, OUTLINE)
-        ).grid(row=0, column=0, padx=5)
-
-        ttk.Button(
-            button_frame,
-            text="Unmark Erroneous",
-            command=unmark_as_erroneous,
-            bootstyle=(SUCCESS, OUTLINE)
-        ).grid(row=0, column=1, padx=5)
-
-
-
-
+        # Rows are loaded page by page as the window is scrolled
+        InvoiceHistoryWindow(self.master, self.db, company_name)
 
     def refresh_form(self):
         """
@@ -897,24 +904,15 @@ class InvoiceApp:
             self.vat_exempt.set(0)
             self.toggle_vat_exemption()
 
-            # Remove all item rows
-            for item in self.items:
-                item["serial"].destroy()
-                item["description"].destroy()
-                item["hours"].destroy()
-                item["price_exc"].destroy()
-                item["vat"].destroy()
-                item["total"].destroy()
-                item["delete_button"].destroy()
-            self.items.clear()
-
-            # Reset Serial Number Counter
-            self.serial_number = 1
-
-            # Add a new empty item row
+            # Remove all item rows and add a new empty one
+            self.item_grid.clear()
             self.add_item_row()
 
     def on_closing(self):
+        # Let a running generation stop before its database is closed
+        if self.generate_thread is not None:
+            self.generate_cancelled.set()
+            self.generate_thread.join()
         # Close database connection
         self.db.close()
         self.master.destroy()
@@ -0,0 +1,188 @@
+# history_window.py
+
+import tkinter as tk
+from tkinter import messagebox
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+
+# (sort key, heading) of the history columns; sort keys are those of
+# Database.get_invoice_page
+COLUMNS = (
+    ("id", "Invoice ID"),
+    ("invoice_number", "Invoice Number"),
+    ("invoice_date", "Date"),
+    ("client_company", "Client"),
+    ("grand_total", "Total (€)"),
+    ("pdf_filename", "PDF File"),
+    ("is_erroneous", "Erroneous"),
+)
+
+# Rows fetched per query while scrolling
+PAGE_SIZE = 200
+
+# Load the next page once the view is scrolled past this fraction of the loaded rows
+LOAD_THRESHOLD = 0.9
+
+# Milliseconds of typing pause before the filter is applied
+FILTER_DELAY_MS = 300
+
+
+class InvoiceHistoryWindow(tk.Toplevel):
+    """
+    Invoice history of one company. Rows are fetched a page at a time as
+    the view is scrolled; sorting (click a column heading) and the filter
+    box run in SQL, and the row count comes from a COUNT query.
+    """
+
+    def __init__(self, master, db, company_name):
+        super().__init__(master)
+        self.db = db
+        self.company_name = company_name
+        self.sort = "invoice_date"
+        self.descending = False
+        self.next_key = None
+        self.exhausted = True
+        self.loading = False
+        self.load_pending = False  # A load_page is queued with after_idle
+        self.filter_job = None
+
+        self.title(f"Invoices for {company_name}")
+        self.geometry("800x600")
+
+        filter_frame = ttk.Frame(self)
+        filter_frame.pack(fill="x", padx=5, pady=5)
+        ttk.Label(filter_frame, text="Filter:").pack(side="left", padx=5)
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", lambda *args: self.schedule_reload())
+        ttk.Entry(filter_frame, textvariable=self.filter_var, width=40, bootstyle=INFO).pack(side="left", padx=5)
+        self.count_label = ttk.Label(filter_frame, text="")
+        self.count_label.pack(side="right", padx=5)
+
+        tree_frame = ttk.Frame(self)
+        tree_frame.pack(fill="both", expand=True)
+        self.tree = ttk.Treeview(
+            tree_frame,
+            columns=[key for key, heading in COLUMNS],
+            show="headings",
+            selectmode="extended"
+        )
+        for key, heading in COLUMNS:
+            self.tree.heading(key, text=heading, command=lambda key=key: self.sort_by(key))
+        self.scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.on_scroll)
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+
+        # Add buttons for marking and unmarking erroneous invoices
+        button_frame = ttk.Frame(self)
+        button_frame.pack(pady=10)
+
+        ttk.Button(
+            button_frame,
+            text="Mark as Erroneous",
+            command=self.mark_as_erroneous,
+            bootstyle=(DANGER, OUTLINE)
+        ).grid(row=0, column=0, padx=5)
+
+        ttk.Button(
+            button_frame,
+            text="Unmark Erroneous",
+            command=self.unmark_as_erroneous,
+            bootstyle=(SUCCESS, OUTLINE)
+        ).grid(row=0, column=1, padx=5)
+
+        self.reload()
+
+    def filters(self):
+        # Keyword arguments shared by the page and count queries
+        return {"text": self.filter_var.get().strip() or None}
+
+    def reload(self):
+        """Clears the tree and loads the first page for the current sort and filter."""
+        self.filter_job = None
+        self.tree.delete(*self.tree.get_children())
+        self.next_key = None
+        self.exhausted = False
+        count = self.db.get_invoice_totals(
+            self.company_name, erroneous=None, **self.filters())["invoice_count"]
+        self.count_label.config(text=f"{count} invoices")
+        self.load_page()
+
+    def load_page(self):
+        self.load_pending = False
+        if self.loading or self.exhausted:
+            return
+        self.loading = True
+        try:
+            rows, self.next_key = self.db.get_invoice_page(
+                self.company_name,
+                after=self.next_key,
+                limit=PAGE_SIZE,
+                sort=self.sort,
+                descending=self.descending,
+                **self.filters()
+            )
+            self.exhausted = self.next_key is None
+            for row in rows:
+                if self.tree.exists(str(row[0])):
+                    continue  # Moved past the page key since it was loaded
+                is_erroneous = "Yes" if row[6] else "No"
+                self.tree.insert("", "end", iid=str(row[0]), values=row[:6] + (is_erroneous,))
+        finally:
+            self.loading = False
+
+    def on_scroll(self, first, last):
+        # Tree yscrollcommand: also fetches more rows near the end, including
+        # until the first pages fill the view
+        self.scrollbar.set(first, last)
+        if float(last) >= LOAD_THRESHOLD and not self.exhausted and not self.load_pending:
+            self.load_pending = True
+            self.after_idle(self.load_page)
+
+    def schedule_reload(self):
+        if self.filter_job is not None:
+            self.after_cancel(self.filter_job)
+        self.filter_job = self.after(FILTER_DELAY_MS, self.reload)
+
+    def sort_by(self, key):
+        """Sorts by a column; clicking the sorted column again reverses the order."""
+        if key == self.sort:
+            self.descending = not self.descending
+        else:
+            self.sort = key
+            self.descending = False
+        for column, heading in COLUMNS:
+            if column == self.sort:
+                heading += " ▼" if self.descending else " ▲"
+            self.tree.heading(column, text=heading)
+        self.reload()
+
+    def mark_as_erroneous(self):
+        self.set_erroneous(True)
+
+    def unmark_as_erroneous(self):
+        self.set_erroneous(False)
+
+    def set_erroneous(self, erroneous):
+        """
+        Flags or unflags the selected invoices in one transaction and updates
+        their rows in place, or reloads when sorted by the flag, since the
+        rows then change position.
+        """
+        action = "mark" if erroneous else "unmark"
+        selected_items = self.tree.selection()
+        if not selected_items:
+            messagebox.showerror("Error", f"Please select invoices to {action} as erroneous.", parent=self)
+            return
+
+        invoice_ids = [int(iid) for iid in selected_items]
+        if erroneous:
+            self.db.mark_invoices_as_erroneous(invoice_ids)
+        else:
+            self.db.unmark_invoices_as_erroneous(invoice_ids)
+        if self.sort == "is_erroneous":
+            self.reload()
+        else:
+            for iid in selected_items:
+                self.tree.set(iid, "is_erroneous", "Yes" if erroneous else "No")
+        messagebox.showinfo("Success", f"{len(invoice_ids)} invoice(s) {action}ed as erroneous.", parent=self)
@@ -1,9 +1,24 @@
 # invoice.py
 
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache, partial
+from pathlib import Path
+
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase.pdfmetrics import registerFont, registerFontFamily, stringWidth
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
 from reportlab.platypus import (
+    Flowable,
+    PageBreak,
     SimpleDocTemplate,
     Table,
     TableStyle,
@@ -11,6 +26,941 @@ from reportlab.platypus import (
     Spacer,
 )
 
+from utils import format_money
+
+# Column shares of the usable page width in the items table
+ITEM_COLUMN_SHARES = (0.1, 0.4, 0.1, 0.1, 0.1, 0.1)
+
+ITEM_HEADER = ["Sr. No.", "Description", "Hours", "Price Exc.", "VAT", "Total"]
+
+# Item count above which the items table is laid out page by page
+LARGE_INVOICE_ITEMS = 500
+
+# Table cell defaults: 10pt on 12pt leading, 6pt side and 3pt top and bottom padding
+CELL_FONT_SIZE = 10
+CELL_LEADING = 12
+CELL_HPADDING = 12
+CELL_VPADDING = 6
+
+# Padding inside the page frame of SimpleDocTemplate
+FRAME_PADDING = 6
+
+# "platypus" lays the invoice out with flowables; "canvas" draws the same
+# fixed layout directly, which is considerably faster
+ENGINES = ("platypus", "canvas")
+
+# Invoice content, passed through the renderer as one dict; see
+# create_invoice_pdf for their meaning
+INVOICE_FIELDS = (
+    "invoicing_company", "kvk", "vat_nr", "bank", "iban", "bic",
+    "client_company", "client_address", "invoice_number", "invoice_date",
+    "expiry_date", "reference", "items", "total_exc", "total_vat",
+    "grand_total", "vat_exempt",
+)
+
+# Part of every render cache key; bump it when the rendered layout changes
+# so PDFs cached with an older layout are not reused
+LAYOUT_VERSION = 1
+
+# Largest size (pt) a logo is drawn at, above the title
+LOGO_MAX_SIZE = (150, 60)
+LOGO_SPACE = 6
+
+# Default size limit of a RenderCache
+RENDER_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class RenderCache:
+    """
+    Content-addressed cache of rendered PDFs, keyed by a SHA-256 hash of
+    every render input, so repeating a request skips the ReportLab build.
+
+    PDFs are kept in memory, or as <key>.pdf files in directory so they are
+    reused by later runs and other processes. Least recently used entries
+    are evicted once the cached PDFs exceed max_bytes.
+    """
+
+    def __init__(self, max_bytes=RENDER_CACHE_BYTES, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = Path(directory) if directory else None
+        # key -> PDF bytes, or their size when stored in directory
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            files = sorted(self.directory.glob("*.pdf"), key=lambda path: path.stat().st_mtime)
+            for path in files:
+                size = path.stat().st_size
+                self.entries[path.stem] = size
+                self.size += size
+            with self.lock:
+                self._evict()
+
+    @staticmethod
+    def make_key(*parts):
+        payload = json.dumps(parts, default=str, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return self.directory / f"{key}.pdf"
+
+    def _entry_size(self, entry):
+        return entry if self.directory else len(entry)
+
+    def _evict(self):
+        while self.size > self.max_bytes and self.entries:
+            key, entry = self.entries.popitem(last=False)
+            self.size -= self._entry_size(entry)
+            if self.directory:
+                try:
+                    self._path(key).unlink()
+                except FileNotFoundError:
+                    pass
+
+    def get(self, key):
+        """
+        Returns the cached PDF bytes for key, or None.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None and self.directory and self._path(key).exists():
+                # Written by another process since this cache was opened
+                entry = self._path(key).stat().st_size
+                self.entries[key] = entry
+                self.size += entry
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            if not self.directory:
+                self.hits += 1
+                return entry
+            try:
+                data = self._path(key).read_bytes()
+                os.utime(self._path(key))  # Keeps the eviction order across runs
+            except FileNotFoundError:
+                # Evicted by another process
+                del self.entries[key]
+                self.size -= entry
+                self.misses += 1
+                return None
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            if self.directory:
+                # Write under a temporary name so readers never see a partial file
+                temp = self.directory / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+                temp.write_bytes(data)
+                os.replace(temp, self._path(key))
+                self.entries[key] = len(data)
+            else:
+                self.entries[key] = data
+            self.size += len(data)
+            self._evict()
+
+    def stats(self):
+        """
+        Returns the hit/miss counters, hit rate and current size of the cache.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+                "bytes": self.size,
+            }
+
+    def clear(self):
+        with self.lock:
+            if self.directory:
+                for key in self.entries:
+                    try:
+                        self._path(key).unlink()
+                    except FileNotFoundError:
+                        pass
+            self.entries.clear()
+            self.size = 0
+
+
+# ----- Branding assets -----
+# Cached per process, so a batch worker loads each logo and font only once
+
+@lru_cache(maxsize=64)
+def _load_logo(path, mtime_ns):
+    reader = ImageReader(path)
+    width, height = reader.getSize()
+    scale = min(LOGO_MAX_SIZE[0] / width, LOGO_MAX_SIZE[1] / height, 1)
+    return reader, width * scale, height * scale
+
+
+def load_logo(path):
+    """
+    Returns (ImageReader, width, height) for a logo file, scaled to fit
+    LOGO_MAX_SIZE. The file is read again only when it changes.
+    """
+    path = os.path.abspath(path)
+    return _load_logo(path, os.stat(path).st_mtime_ns)
+
+
+def file_key(path):
+    # Identifies a version of a logo or font file in render cache keys
+    if not path:
+        return None
+    path = os.path.abspath(path)
+    return [path, os.stat(path).st_mtime_ns]
+
+
+@lru_cache(maxsize=None)
+def _register_font(path):
+    name = f"{Path(path).stem}-{hashlib.sha1(path.encode('utf-8')).hexdigest()[:8]}"
+    registerFont(TTFont(name, path))
+    # A single face, also used where the layout asks for bold
+    registerFontFamily(name, normal=name, bold=name, italic=name, boldItalic=name)
+    return name
+
+
+def register_font(path):
+    """
+    Registers a TTF font file with ReportLab once per process and returns
+    its font name.
+    """
+    return _register_font(os.path.abspath(path))
+
+
+def write_pdf(pdf_filename, data):
+    """
+    Delivers rendered PDF bytes the way render does: returns them if
+    pdf_filename is None, otherwise writes them to the file or stream.
+    data is None when the PDF was already written to pdf_filename.
+    """
+    if pdf_filename is None:
+        return data
+    if data is not None:
+        if hasattr(pdf_filename, "write"):
+            pdf_filename.write(data)
+        else:
+            with open(pdf_filename, "wb") as f:
+                f.write(data)
+    return None
+
+
+class InvoiceRenderer:
+    """
+    Renders invoice PDFs with ReportLab's Platypus.
+
+    The stylesheet, table styles, column widths and header row do not depend
+    on the invoice, so they are built once here and shared by every render.
+    With a RenderCache, repeated requests are served from the cache. font is
+    the path of a TTF font used for all text instead of Helvetica.
+    """
+
+    def __init__(self, pagesize=A4, margins=(30, 30, 30, 18), cache=None, font=None):
+        self.pagesize = pagesize
+        self.margins = margins
+        self.cache = cache
+        self.right_margin, self.left_margin, self.top_margin, self.bottom_margin = margins
+
+        self.font_path = font
+        if font:
+            self.font_name = self.bold_font_name = register_font(font)
+        else:
+            self.font_name, self.bold_font_name = "Helvetica", "Helvetica-Bold"
+        # Renderers for other fonts, see for_font
+        self.font_variants = {}
+
+        self.styles = getSampleStyleSheet()
+        self.style_normal = ParagraphStyle(
+            "InvoiceNormal", parent=self.styles["Normal"], fontName=self.font_name)
+        self.style_title = ParagraphStyle(
+            "InvoiceTitle", parent=self.styles["Title"], fontName=self.bold_font_name)
+
+        # Calculate column widths from the usable width
+        page_width = pagesize[0] - self.left_margin - self.right_margin
+        self.col_widths = [share * page_width for share in ITEM_COLUMN_SHARES]
+        self.header_row = list(ITEM_HEADER)
+        self.description_width = self.col_widths[1] - CELL_HPADDING
+        self.line_row_height = CELL_LEADING + CELL_VPADDING
+
+        self.items_table_style = TableStyle(
+            [
+                ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+                ("GRID", (0, 0), (-1, -1), 1, colors.black),
+                ("FONTNAME", (0, 0), (-1, -1), self.font_name),
+                ("FONTNAME", (0, 0), (-1, 0), self.bold_font_name),
+                ("ALIGN", (2, 1), (2, -1), "RIGHT"),
+                ("ALIGN", (3, 1), (-1, -1), "RIGHT"),
+                ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+                ("WORDWRAP", (0, 0), (-1, -1)),  # Enable word wrapping
+            ]
+        )
+        self.totals_col_widths = [250, 150]
+
+        # Geometry for the canvas engine, placing everything where the
+        # Platypus frame would: tables are centred in the frame
+        self.frame_x = self.left_margin + FRAME_PADDING
+        self.frame_width = pagesize[0] - self.left_margin - self.right_margin - 2 * FRAME_PADDING
+        self.frame_top = pagesize[1] - self.top_margin - FRAME_PADDING
+        self.frame_bottom = self.bottom_margin + FRAME_PADDING
+        self.col_edges = self._column_edges(self.col_widths)
+        self.totals_col_edges = self._column_edges(self.totals_col_widths)
+        self.totals_table_style = TableStyle(
+            [
+                ("GRID", (0, 0), (-1, -1), 1, colors.black),
+                ("FONTNAME", (0, 0), (-1, -1), self.bold_font_name),
+                ("ALIGN", (1, 0), (-1, -1), "RIGHT"),
+            ]
+        )
+
+    def render(self, pdf_filename, invoice, large=None, engine="platypus", logo=None, font=None):
+        """
+        Generates a PDF invoice.
+
+        Parameters:
+            pdf_filename (str or file-like): The filename for the generated PDF,
+                or a binary stream to write it to. If None, the PDF is returned.
+            invoice (dict): The INVOICE_FIELDS, as described for create_invoice_pdf.
+            large (bool): Lay out the items table one page at a time while
+                reading items, so memory stays flat for very long invoices.
+                items may then be any iterable. Defaults to doing so for
+                iterators and for more than LARGE_INVOICE_ITEMS items.
+            engine (str): One of ENGINES. The canvas engine draws the same
+                layout without Platypus and always reads items as it goes.
+            logo (str): Path of an image drawn top right, above the title.
+            font (str): Path of a TTF font for all text.
+
+        If the renderer has a cache and items is a list, an identical earlier
+        request is answered with the cached PDF.
+
+        Returns:
+            bytes: The PDF if pdf_filename is None, otherwise None.
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}.")
+        if font and font != self.font_path:
+            return self.for_font(font).render(pdf_filename, invoice, large, engine, logo, font)
+        items = invoice["items"]
+        if large is None:
+            large = not hasattr(items, "__len__") or len(items) > LARGE_INVOICE_ITEMS
+
+        # Only complete item lists can be hashed; iterators are read while rendering
+        cache_key = None
+        if self.cache is not None and hasattr(items, "__len__"):
+            cache_key = self.cache_key(engine, large, logo, invoice)
+            data = self.cache.get(cache_key)
+            if data is not None:
+                return write_pdf(pdf_filename, data)
+
+        # Cached renders go through memory so the bytes can be stored
+        if pdf_filename is None or cache_key is not None:
+            output = io.BytesIO()
+        else:
+            output = pdf_filename
+        if engine == "canvas":
+            self.draw_invoice(output, invoice, logo)
+        else:
+            self.build_invoice(output, invoice, large, logo)
+        data = output.getvalue() if output is not pdf_filename else None
+        if cache_key is not None:
+            self.cache.put(cache_key, data)
+        return write_pdf(pdf_filename, data)
+
+    def cache_key(self, engine, large, logo, invoice):
+        """
+        Returns the content hash of a render request: every input that
+        affects the output, including the layout settings of this renderer.
+        """
+        return RenderCache.make_key(
+            LAYOUT_VERSION, engine, bool(large), self.pagesize, self.margins,
+            file_key(self.font_path), file_key(logo),
+            *(invoice[field] for field in INVOICE_FIELDS),
+        )
+
+    def for_font(self, font):
+        """
+        Returns a renderer like this one that uses the TTF font at path font.
+        Its styles are built on first use and kept for later renders.
+        """
+        if not font or font == self.font_path:
+            return self
+        variant = self.font_variants.get(font)
+        if variant is None:
+            variant = InvoiceRenderer(self.pagesize, self.margins, font=font)
+            self.font_variants[font] = variant
+        variant.cache = self.cache
+        return variant
+
+    def doc_template(self, output):
+        return SimpleDocTemplate(
+            output,
+            pagesize=self.pagesize,
+            rightMargin=self.right_margin,
+            leftMargin=self.left_margin,
+            topMargin=self.top_margin,
+            bottomMargin=self.bottom_margin,
+        )
+
+    def build_invoice(self, output, invoice, large, logo=None):
+        """
+        Lays out the invoice with Platypus flowables (the "platypus" engine).
+        Parameters are those of render, with output a filename or stream.
+        """
+        doc = self.doc_template(output)
+        doc.build(self.invoice_story(invoice, large, logo))
+
+    def invoice_story(self, invoice, large, logo=None):
+        """
+        Returns the Platypus flowables of one invoice.
+        """
+        elements = []
+        style_normal = self.style_normal
+
+        # Logo
+        if logo:
+            elements.append(Logo(*load_logo(logo)))
+            elements.append(Spacer(1, LOGO_SPACE))
+
+        # Title
+        elements.append(Paragraph("INVOICE", self.style_title))
+        elements.append(Spacer(1, 12))
+
+        # To Section
+        to_info = f"<b>To:</b><br/>{invoice['client_company']}<br/>{invoice['client_address']}"
+        elements.append(Paragraph(to_info, style_normal))
+        elements.append(Spacer(1, 12))
+
+        # Invoicing Company Details
+        company_details = (
+            f"<b>Invoicing Company:</b> {invoice['invoicing_company']}<br/>"
+            f"<b>KvK nr:</b> {invoice['kvk']}<br/>"
+            f"<b>VAT nr:</b> {invoice['vat_nr']}<br/>"
+            f"<b>Bank:</b> {invoice['bank']}<br/>"
+            f"<b>IBAN:</b> {invoice['iban']}<br/>"
+            f"<b>BIC:</b> {invoice['bic']}"
+        )
+        elements.append(Paragraph(company_details, style_normal))
+        elements.append(Spacer(1, 12))
+
+        # Invoice Details
+        invoice_details = (
+            f"<b>Invoice Number:</b> {invoice['invoice_number']}<br/>"
+            f"<b>Invoice Date:</b> {invoice['invoice_date']}<br/>"
+            f"<b>Expiry Date:</b> {invoice['expiry_date']}<br/>"
+            f"<b>Reference:</b> {invoice['reference']}"
+        )
+        elements.append(Paragraph(invoice_details, style_normal))
+        elements.append(Spacer(1, 24))
+
+        # Items Table
+        if large:
+            elements.append(ItemTableStream(self, invoice["items"]))
+        else:
+            data = [self.header_row]
+            for item in invoice["items"]:
+                data.append(
+                    [
+                        Paragraph(str(item["serial"]), style_normal),
+                        Paragraph(item["description"], style_normal),
+                        f"{item['hours']:.2f}",
+                        format_money(item["price_exc"]),
+                        format_money(item["vat"]),
+                        format_money(item["total"]),
+                    ]
+                )
+            table = Table(data, colWidths=self.col_widths)
+            table.setStyle(self.items_table_style)
+            elements.append(table)
+        elements.append(Spacer(1, 12))
+
+        # Totals Table
+        totals_data = [
+            ["Total Exc.", format_money(invoice["total_exc"])],
+            ["Total VAT:", format_money(invoice["total_vat"])],
+            ["Grand Total:", format_money(invoice["grand_total"])],
+        ]
+        totals_table = Table(totals_data, colWidths=self.totals_col_widths)
+        totals_table.setStyle(self.totals_table_style)
+        elements.append(totals_table)
+        elements.append(Spacer(1, 24))
+
+        # Exemption or Payment Instructions
+        if invoice["vat_exempt"]:
+            exemption_note = "Invoice exempt from OB based on article 25 OB."
+            elements.append(Paragraph(exemption_note, style_normal))
+        else:
+            payment_instructions = "Please make payment within 30 days to the above account number quoting the invoice number."
+            elements.append(Paragraph(payment_instructions, style_normal))
+
+        return elements
+
+    # ----- Canvas engine -----
+
+    def _column_edges(self, widths):
+        x = self.frame_x + (self.frame_width - sum(widths)) / 2
+        edges = [x]
+        for width in widths:
+            x += width
+            edges.append(x)
+        return edges
+
+    def wrap_text(self, text, width, first_width=None, font_name=None, font_size=CELL_FONT_SIZE):
+        """
+        Splits text into lines the way a Paragraph wraps it: whitespace,
+        including newlines, separates words, and lines break greedily.
+        first_width is the room left on the first line.
+        """
+        font_name = font_name or self.font_name
+        lines = []
+        line = ""
+        limit = width if first_width is None else first_width
+        for word in text.split():
+            candidate = f"{line} {word}" if line else word
+            if line and stringWidth(candidate, font_name, font_size) > limit:
+                lines.append(line)
+                line = word
+                limit = width
+            else:
+                line = candidate
+        lines.append(line)
+        return lines
+
+    def _draw_block(self, canv, y, lines):
+        """
+        Draws a Normal-style paragraph of (bold label, value) lines below y
+        and returns the y below it.
+        """
+        style = self.style_normal
+        bold = self.bold_font_name
+        for label, value in lines:
+            x = self.frame_x
+            if label:
+                canv.setFont(bold, style.fontSize)
+                canv.drawString(x, y - style.fontSize, label)
+                if value is None:
+                    y -= style.leading
+                    continue
+                x += stringWidth(label, bold, style.fontSize) + stringWidth(" ", style.fontName, style.fontSize)
+            first_width = self.frame_width - (x - self.frame_x)
+            canv.setFont(style.fontName, style.fontSize)
+            for line in self.wrap_text(str(value), self.frame_width, first_width,
+                                       style.fontName, style.fontSize):
+                canv.drawString(x, y - style.fontSize, line)
+                x = self.frame_x
+                y -= style.leading
+        return y
+
+    def _draw_row(self, canv, top, edges, cells, height, right_from):
+        """
+        Draws one table row of line lists, vertically centred like the
+        tables' VALIGN MIDDLE. Columns from right_from on are right aligned.
+        """
+        bottom = top - height
+        pad = CELL_HPADDING / 2
+        for index, lines in enumerate(cells):
+            y = bottom + (height + CELL_LEADING * len(lines)) / 2 - CELL_FONT_SIZE
+            for line in lines:
+                if index >= right_from:
+                    canv.drawRightString(edges[index + 1] - pad, y, line)
+                else:
+                    canv.drawString(edges[index] + pad, y, line)
+                y -= CELL_LEADING
+        return bottom
+
+    def _draw_grid(self, canv, edges, row_edges):
+        canv.setLineWidth(1)
+        canv.grid(edges, row_edges)
+
+    def _draw_header_row(self, canv, top):
+        edges = self.col_edges
+        canv.setFillColor(colors.lightgrey)
+        canv.rect(edges[0], top - self.line_row_height, edges[-1] - edges[0],
+                  self.line_row_height, stroke=0, fill=1)
+        canv.setFillColor(colors.black)
+        canv.setFont(self.bold_font_name, CELL_FONT_SIZE)
+        bottom = self._draw_row(canv, top, edges, [[cell] for cell in self.header_row],
+                                self.line_row_height, len(edges))
+        canv.setFont(self.font_name, CELL_FONT_SIZE)
+        return bottom
+
+    def _draw_items(self, canv, y, items):
+        """
+        Draws the items table from y on, continuing on new pages with the
+        header row repeated. Returns the y below the table.
+        """
+        wrap_width = self.description_width
+        row_edges = None  # Horizontal lines of the table part on this page
+        for item in items:
+            cells = [
+                self.wrap_text(str(item["serial"]), self.col_widths[0] - CELL_HPADDING),
+                self.wrap_text(item["description"], wrap_width),
+                [f"{item['hours']:.2f}"],
+                [format_money(item["price_exc"])],
+                [format_money(item["vat"])],
+                [format_money(item["total"])],
+            ]
+            height = max(len(cells[0]), len(cells[1])) * CELL_LEADING + CELL_VPADDING
+            needed = height if row_edges else self.line_row_height + height
+            if y - needed < self.frame_bottom:
+                if row_edges:
+                    self._draw_grid(canv, self.col_edges, row_edges)
+                    row_edges = None
+                canv.showPage()
+                y = self.frame_top
+            if row_edges is None:
+                row_edges = [y]
+                y = self._draw_header_row(canv, y)
+                row_edges.append(y)
+            y = self._draw_row(canv, y, self.col_edges, cells, height, 2)
+            row_edges.append(y)
+        if row_edges:
+            self._draw_grid(canv, self.col_edges, row_edges)
+        return y
+
+    def draw_invoice(self, output, invoice, logo=None):
+        """
+        Draws the invoice layout directly on a canvas (the "canvas" engine).
+        Parameters are those of render, with output a filename or stream.
+        """
+        canv = Canvas(output, pagesize=self.pagesize)
+        self.draw_pages(canv, invoice, logo)
+        canv.save()
+
+    def draw_pages(self, canv, invoice, logo=None):
+        """
+        Draws one invoice on canv, starting and ending with a fresh page.
+        """
+        y = self.frame_top
+
+        # Logo
+        if logo:
+            reader, width, height = load_logo(logo)
+            canv.drawImage(reader, self.frame_x + self.frame_width - width, y - height,
+                           width, height, mask="auto")
+            y -= height + LOGO_SPACE
+
+        # Title
+        title = self.style_title
+        canv.setFont(title.fontName, title.fontSize)
+        canv.drawCentredString(self.frame_x + self.frame_width / 2, y - title.fontSize, "INVOICE")
+        y -= title.leading + title.spaceAfter + 12
+
+        # To Section, Invoicing Company Details and Invoice Details
+        blocks = (
+            ([("To:", None), (None, invoice["client_company"]), (None, invoice["client_address"])], 12),
+            (
+                [
+                    ("Invoicing Company:", invoice["invoicing_company"]),
+                    ("KvK nr:", invoice["kvk"]),
+                    ("VAT nr:", invoice["vat_nr"]),
+                    ("Bank:", invoice["bank"]),
+                    ("IBAN:", invoice["iban"]),
+                    ("BIC:", invoice["bic"]),
+                ],
+                12,
+            ),
+            (
+                [
+                    ("Invoice Number:", invoice["invoice_number"]),
+                    ("Invoice Date:", invoice["invoice_date"]),
+                    ("Expiry Date:", invoice["expiry_date"]),
+                    ("Reference:", invoice["reference"]),
+                ],
+                24,
+            ),
+        )
+        for lines, space_after in blocks:
+            y = self._draw_block(canv, y, lines) - space_after
+
+        # Items Table
+        y = self._draw_items(canv, y, invoice["items"]) - 12
+
+        # Totals Table, kept on one page
+        totals_data = [
+            ["Total Exc.", format_money(invoice["total_exc"])],
+            ["Total VAT:", format_money(invoice["total_vat"])],
+            ["Grand Total:", format_money(invoice["grand_total"])],
+        ]
+        if y - len(totals_data) * self.line_row_height < self.frame_bottom:
+            canv.showPage()
+            y = self.frame_top
+        canv.setFont(self.bold_font_name, CELL_FONT_SIZE)
+        row_edges = [y]
+        for label, amount in totals_data:
+            y = self._draw_row(canv, y, self.totals_col_edges, [[label], [amount]],
+                               self.line_row_height, 1)
+            row_edges.append(y)
+        self._draw_grid(canv, self.totals_col_edges, row_edges)
+        y -= 24
+
+        # Exemption or Payment Instructions
+        if invoice["vat_exempt"]:
+            note = "Invoice exempt from OB based on article 25 OB."
+        else:
+            note = "Please make payment within 30 days to the above account number quoting the invoice number."
+        style = self.style_normal
+        lines = self.wrap_text(note, self.frame_width, None, style.fontName, style.fontSize)
+        if y - len(lines) * style.leading < self.frame_bottom:
+            canv.showPage()
+            y = self.frame_top
+        self._draw_block(canv, y, [(None, line) for line in lines])
+        canv.showPage()
+
+    # ----- Combined documents -----
+
+    def render_combined(self, pdf_filename, invoices, engine="platypus"):
+        """
+        Renders many invoices into one PDF, each starting on a new page.
+        Pages are numbered per invoice ("Invoice 42 - page 1 of 2"), and the
+        styles and fonts are shared by the whole document.
+
+        Parameters:
+            pdf_filename (str or file-like): As for render; None returns bytes.
+            invoices (iterable of dict): The INVOICE_FIELDS of each invoice,
+                with its large, logo and font options where wanted.
+            engine (str): One of ENGINES.
+
+        With a cache, invoices are read up front so the whole document can
+        be looked up; this needs every invoice's items to be a list.
+
+        Returns:
+            bytes: The PDF if pdf_filename is None, otherwise None.
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}.")
+
+        cache_key = None
+        if self.cache is not None:
+            invoices = list(invoices)
+            if all(hasattr(invoice["items"], "__len__") for invoice in invoices):
+                cache_key = RenderCache.make_key("combined", [
+                    self.for_font(invoice.get("font")).cache_key(
+                        engine, invoice.get("large"), invoice.get("logo"), invoice)
+                    for invoice in invoices
+                ])
+                data = self.cache.get(cache_key)
+                if data is not None:
+                    return write_pdf(pdf_filename, data)
+
+        if pdf_filename is None or cache_key is not None:
+            output = io.BytesIO()
+        else:
+            output = pdf_filename
+        footer_x = self.pagesize[0] - self.right_margin
+
+        if engine == "canvas":
+            canv = InvoicePageCanvas(output, pagesize=self.pagesize, footer_x=footer_x)
+            for invoice in invoices:
+                renderer = self.for_font(invoice.get("font"))
+                canv.start_invoice(invoice["invoice_number"])
+                renderer.draw_pages(canv, invoice, invoice.get("logo"))
+            canv.save()
+        else:
+            elements = []
+            for invoice in invoices:
+                items = invoice["items"]
+                large = invoice.get("large")
+                if large is None:
+                    large = not hasattr(items, "__len__") or len(items) > LARGE_INVOICE_ITEMS
+                renderer = self.for_font(invoice.get("font"))
+                if elements:
+                    elements.append(PageBreak())
+                elements.append(InvoiceStart(invoice["invoice_number"]))
+                elements.extend(renderer.invoice_story(invoice, large, invoice.get("logo")))
+            self.doc_template(output).build(
+                elements, canvasmaker=partial(InvoicePageCanvas, footer_x=footer_x))
+
+        data = output.getvalue() if output is not pdf_filename else None
+        if cache_key is not None:
+            self.cache.put(cache_key, data)
+        return write_pdf(pdf_filename, data)
+
+    # ----- Large invoices -----
+
+    def item_row(self, item):
+        """
+        Returns the cells of an item row and the row's height. Descriptions
+        that fit on one line stay plain strings, which the table draws
+        without the cost of a Paragraph.
+        """
+        description = item["description"]
+        if (
+            "\n" not in description
+            and "<" not in description
+            and "&" not in description
+            and stringWidth(description, self.font_name, CELL_FONT_SIZE) <= self.description_width
+        ):
+            height = self.line_row_height
+        else:
+            description = Paragraph(description, self.style_normal)
+            height = max(
+                description.wrap(self.description_width, self.pagesize[1])[1] + CELL_VPADDING,
+                self.line_row_height,
+            )
+        row = [
+            str(item["serial"]),
+            description,
+            f"{item['hours']:.2f}",
+            format_money(item["price_exc"]),
+            format_money(item["vat"]),
+            format_money(item["total"]),
+        ]
+        return row, height
+
+
+class InvoicePageCanvas(Canvas):
+    """
+    Canvas for combined documents. Finished pages are held back until save,
+    when the page count of every invoice is known, and then get a footer
+    numbering them within their invoice.
+    """
+
+    def __init__(self, *args, footer_x=None, **kwargs):
+        Canvas.__init__(self, *args, **kwargs)
+        self.footer_x = footer_x
+        self.page_states = []
+        self.invoice_index = -1
+        self.invoice_label = ""
+
+    def start_invoice(self, invoice_number):
+        self.invoice_index += 1
+        self.invoice_label = f"Invoice {invoice_number}"
+
+    def showPage(self):
+        self.page_states.append((self.invoice_index, self.invoice_label, dict(self.__dict__)))
+        self._startPage()
+
+    def save(self):
+        page_counts = {}
+        for index, _, _ in self.page_states:
+            page_counts[index] = page_counts.get(index, 0) + 1
+        page_numbers = {}
+        for index, label, state in self.page_states:
+            self.__dict__.update(state)
+            page_numbers[index] = page_numbers.get(index, 0) + 1
+            self.setFont("Helvetica", 8)
+            self.drawRightString(
+                self.footer_x or self._pagesize[0] - 30, 8,
+                f"{label} - page {page_numbers[index]} of {page_counts[index]}",
+            )
+            Canvas.showPage(self)
+        Canvas.save(self)
+
+
+class Logo(Flowable):
+    """
+    A decoded logo image, right aligned in the frame.
+    """
+
+    def __init__(self, reader, width, height):
+        Flowable.__init__(self)
+        self.reader = reader
+        self.width = width
+        self.height = height
+        self.hAlign = "RIGHT"
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.drawImage(self.reader, 0, 0, self.width, self.height, mask="auto")
+
+
+class InvoiceStart(Flowable):
+    """
+    Zero-size marker at the start of each invoice in a combined document.
+    """
+
+    def __init__(self, invoice_number):
+        Flowable.__init__(self)
+        self.invoice_number = invoice_number
+
+    def wrap(self, availWidth, availHeight):
+        return 0, 0
+
+    def draw(self):
+        self.canv.start_invoice(self.invoice_number)
+
+
+class ItemTableStream(Flowable):
+    """
+    Items table of a large invoice. Each time it is split, it pulls rows
+    from the items iterator until the space left on the page is filled and
+    returns them as one Table with the header row, followed by itself for
+    the remaining items. Only the rows of the current page are in memory.
+    """
+
+    def __init__(self, renderer, items):
+        Flowable.__init__(self)
+        self.renderer = renderer
+        self.rows = map(renderer.item_row, items)
+        self.next_row = next(self.rows, None)
+
+    def wrap(self, availWidth, availHeight):
+        if self.next_row is None:
+            return availWidth, 0
+        # Too tall for any frame, so the document asks for a split
+        return availWidth, availHeight + 1
+
+    def split(self, availWidth, availHeight):
+        renderer = self.renderer
+        data = [renderer.header_row]
+        heights = [renderer.line_row_height]
+        used = heights[0]
+        while self.next_row is not None:
+            row, height = self.next_row
+            if used + height > availHeight:
+                break
+            data.append(row)
+            heights.append(height)
+            used += height
+            self.next_row = next(self.rows, None)
+        if len(data) == 1:
+            return []  # Not even one row fits; continue on the next page
+
+        # The document marks a flowable that did not fit as postponed and
+        # gives up if it fails again; this one made progress, so reset it
+        self.__dict__.pop("_postponed", None)
+
+        table = Table(data, colWidths=renderer.col_widths, rowHeights=heights)
+        table.setStyle(renderer.items_table_style)
+        if self.next_row is None:
+            return [table]
+        return [table, self]
+
+    def draw(self):
+        pass
+
+
+# Shared by create_invoice_pdf; each worker process of batch.py gets its own.
+# Set default_renderer.cache to a RenderCache to enable caching.
+default_renderer = InvoiceRenderer()
+
+
+@lru_cache(maxsize=8)
+def _cached_renderer(cache):
+    return InvoiceRenderer(cache=cache)
+
+
+def renderer_for_cache(cache=None):
+    """
+    Returns the default renderer, or for a RenderCache a renderer that uses
+    it. One renderer is kept per cache, so its styles are built only once.
+    """
+    if cache is None or cache is default_renderer.cache:
+        return default_renderer
+    return _cached_renderer(cache)
+
+
 def create_invoice_pdf(
     pdf_filename,
     invoicing_company,
@@ -29,13 +979,18 @@ def create_invoice_pdf(
     total_exc,
     total_vat,
     grand_total,
-    vat_exempt
+    vat_exempt,
+    large=None,
+    engine="platypus",
+    logo=None,
+    font=None
 ):
     """
-    Generates a PDF invoice using ReportLab's Platypus.
+    Generates a PDF invoice with the default renderer.
 
     Parameters:
-        pdf_filename (str): The filename for the generated PDF.
+        pdf_filename (str or file-like): The filename for the generated PDF,
+            or a binary stream to write it to. If None, the PDF is returned.
         invoicing_company (str): Name of the invoicing company.
         kvk (str): KVK number.
         vat_nr (str): VAT number.
@@ -49,125 +1004,132 @@ def create_invoice_pdf(
         expiry_date (str): Expiry date in dd-mm-yyyy format.
         reference (str): Reference for the invoice.
         items (list of dict): List of items, each dict contains 'serial', 'description', 'hours', 'price_exc', 'vat', 'total'.
-        total_exc (float): Total price excluding VAT.
-        total_vat (float): Total VAT.
-        grand_total (float): Grand total including VAT.
+        total_exc (Decimal): Total price excluding VAT (see utils.calculate_totals).
+        total_vat (Decimal): Total VAT.
+        grand_total (Decimal): Grand total including VAT.
         vat_exempt (bool): VAT exemption flag.
+        large, engine, logo, font: See InvoiceRenderer.render.
+
+    Returns:
+        bytes: The PDF if pdf_filename is None, otherwise None.
     """
-    doc = SimpleDocTemplate(
-        pdf_filename,
-        pagesize=A4,
-        rightMargin=30,
-        leftMargin=30,
-        topMargin=30,
-        bottomMargin=18,
-    )
-    elements = []
-    styles = getSampleStyleSheet()
-    style_normal = styles["Normal"]
-
-    # Title
-    elements.append(Paragraph("INVOICE", styles["Title"]))
-    elements.append(Spacer(1, 12))
-
-    # To Section
-    to_info = f"<b>To:</b><br/>{client_company}<br/>{client_address}"
-    elements.append(Paragraph(to_info, style_normal))
-    elements.append(Spacer(1, 12))
-
-    # Invoicing Company Details
-    company_details = (
-        f"<b>Invoicing Company:</b> {invoicing_company}<br/>"
-        f"<b>KvK nr:</b> {kvk}<br/>"
-        f"<b>VAT nr:</b> {vat_nr}<br/>"
-        f"<b>Bank:</b> {bank}<br/>"
-        f"<b>IBAN:</b> {iban}<br/>"
-        f"<b>BIC:</b> {bic}"
-    )
-    elements.append(Paragraph(company_details, style_normal))
-    elements.append(Spacer(1, 12))
-
-    # Invoice Details
-    invoice_details = (
-        f"<b>Invoice Number:</b> {invoice_number}<br/>"
-        f"<b>Invoice Date:</b> {invoice_date}<br/>"
-        f"<b>Expiry Date:</b> {expiry_date}<br/>"
-        f"<b>Reference:</b> {reference}"
-    )
-    elements.append(Paragraph(invoice_details, style_normal))
-    elements.append(Spacer(1, 24))
-
-    # Items Table
-    data = [
-        [
-            "Sr. No.",
-            "Description",
-            "Hours",
-            "Price Exc.",
-            "VAT",
-            "Total",
-        ]
-    ]
-    for item in items:
-        data.append(
-            [
-                Paragraph(str(item["serial"]), styles["Normal"]),
-                Paragraph(item["description"], styles["Normal"]),
-                f"{item['hours']:.2f}",
-                f"€{item['price_exc']:.2f}",
-                f"€{item['vat']:.2f}",
-                f"€{item['total']:.2f}",
-            ]
-        )
+    invoice = {
+        "invoicing_company": invoicing_company,
+        "kvk": kvk,
+        "vat_nr": vat_nr,
+        "bank": bank,
+        "iban": iban,
+        "bic": bic,
+        "client_company": client_company,
+        "client_address": client_address,
+        "invoice_number": invoice_number,
+        "invoice_date": invoice_date,
+        "expiry_date": expiry_date,
+        "reference": reference,
+        "items": items,
+        "total_exc": total_exc,
+        "total_vat": total_vat,
+        "grand_total": grand_total,
+        "vat_exempt": vat_exempt,
+    }
+    return default_renderer.render(pdf_filename, invoice, large, engine, logo, font)
+
+def create_combined_pdf(pdf_filename, invoices, engine="platypus"):
+    """
+    Renders many invoices into one PDF with the default renderer.
+    See InvoiceRenderer.render_combined for the parameters.
+    """
+    return default_renderer.render_combined(pdf_filename, invoices, engine)
 
-    # Calculate column widths dynamically
-    page_width = A4[0] - 60  # Usable width
-    colWidths = [0.1 * page_width, 0.4 * page_width, 0.1 * page_width, 0.1 * page_width, 0.1 * page_width, 0.1 * page_width]
-
-    # Create the table
-    table = Table(data, colWidths=colWidths)
-    table_style = TableStyle(
-        [
-            ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-            ("GRID", (0, 0), (-1, -1), 1, colors.black),
-            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ("ALIGN", (2, 1), (2, -1), "RIGHT"),
-            ("ALIGN", (3, 1), (-1, -1), "RIGHT"),
-            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-            ("WORDWRAP", (0, 0), (-1, -1)),  # Enable word wrapping
 
-        ]
-    )
-    table.setStyle(table_style)
-    elements.append(table)
-    elements.append(Spacer(1, 12))
-
-
-    # Totals Table
-    totals_data = []
-    totals_data.append(["Total Exc.", f"€{total_exc:.2f}"])
-    totals_data.append(["Total VAT:", f"€{total_vat:.2f}"])
-    totals_data.append(["Grand Total:", f"€{grand_total:.2f}"])
-
-    totals_table = Table(totals_data, colWidths=[250, 150])
-    totals_table_style = TableStyle(
-        [
-            ("GRID", (0, 0), (-1, -1), 1, colors.black),
-            ("FONTNAME", (0, 0), (-1, -1), "Helvetica-Bold"),
-            ("ALIGN", (1, 0), (-1, -1), "RIGHT"),
-        ]
+def invoice_from_db(db, invoice_id):
+    """
+    Returns the render arguments of a stored invoice, without pdf_filename.
+
+    Company and client details, invoice metadata, totals and line items
+    are those stored with the invoice. Invoices stored before details were
+    kept use the current company and client rows.
+    """
+    return _render_args(db, _load_invoice(db, invoice_id))
+
+
+def _load_invoice(db, invoice_id):
+    invoice = db.get_invoice(invoice_id)
+    if invoice is None:
+        raise ValueError(f"Invoice {invoice_id} not found.")
+    return invoice
+
+
+def _render_args(db, invoice):
+    # Details stored with the invoice; older invoices have none and use the
+    # current company and client rows
+    company_details = (invoice["kvk"], invoice["vat_nr"], invoice["bank"],
+                       invoice["iban"], invoice["bic"])
+    if all(value is None for value in company_details):
+        company_details = db.get_invoicing_company_details(invoice["invoicing_company"])
+        if not company_details:
+            raise ValueError(f"Details for {invoice['invoicing_company']} not found.")
+    client_address = invoice["client_address"]
+    if client_address is None:
+        client_details = db.get_client_details(invoice["client_company"])
+        client_address = client_details[0] if client_details else ""
+    kvk, vat_nr, bank, iban, bic = company_details
+    logo, font = db.get_invoicing_company_branding(invoice["invoicing_company"]) or (None, None)
+
+    return {
+        "invoicing_company": invoice["invoicing_company"],
+        "kvk": kvk,
+        "vat_nr": vat_nr,
+        "bank": bank,
+        "iban": iban,
+        "bic": bic,
+        "client_company": invoice["client_company"],
+        "client_address": client_address,
+        "invoice_number": str(invoice["invoice_number"]),
+        "invoice_date": invoice["invoice_date"],
+        "expiry_date": invoice["expiry_date"],
+        "reference": invoice["reference"],
+        "items": invoice["items"],
+        "total_exc": invoice["total_exc"],
+        "total_vat": invoice["total_vat"],
+        "grand_total": invoice["grand_total"],
+        "vat_exempt": bool(invoice["vat_exempt"]),
+        "logo": logo,
+        "font": font,
+    }
+
+
+def render_invoice_from_db(db, invoice_id, pdf_filename=None, cache=None):
+    """
+    Re-renders a stored invoice from the database, without the GUI.
+
+    Parameters:
+        db (Database): Open database.
+        invoice_id (int): Id of the invoice row.
+        pdf_filename (str or file-like): Output filename or binary stream.
+            Defaults to the stored pdf_filename.
+        cache (RenderCache): Serves unchanged invoices without rendering,
+            e.g. RenderCache(directory=...) to reuse PDFs across runs.
+
+    Returns:
+        str or file-like: Where the PDF was written.
+    """
+    invoice = _load_invoice(db, invoice_id)
+    pdf_filename = pdf_filename or invoice["pdf_filename"]
+    fields = _render_args(db, invoice)
+    logo, font = fields.pop("logo"), fields.pop("font")
+    renderer_for_cache(cache).render(pdf_filename, fields, logo=logo, font=font)
+    return pdf_filename
+
+
+def render_invoices_from_db(db, invoice_ids, pdf_filename, engine="platypus", cache=None):
+    """
+    Renders stored invoices into one combined PDF, e.g. for a month-end
+    statement run. pdf_filename is as for create_combined_pdf, and cache
+    as for render_invoice_from_db.
+    """
+    return renderer_for_cache(cache).render_combined(
+        pdf_filename,
+        (invoice_from_db(db, invoice_id) for invoice_id in invoice_ids),
+        engine,
     )
-    totals_table.setStyle(totals_table_style)
-    elements.append(totals_table)
-    elements.append(Spacer(1, 24))
-
-    # Exemption or Payment Instructions
-    if vat_exempt:
-        exemption_note = "Invoice exempt from OB based on article 25 OB."
-        elements.append(Paragraph(exemption_note, style_normal))
-    else:
-        payment_instructions = "Please make payment within 30 days to the above account number quoting the invoice number."
-        elements.append(Paragraph(payment_instructions, style_normal))
-
-    # Build PDF
-    doc.build(elements)
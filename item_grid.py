@@ -0,0 +1,603 @@
+# item_grid.py
+
+import itertools
+import tkinter as tk
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+
+from utils import from_cents, to_cents, to_decimal
+
+# (field, header, width in characters) of the item columns
+COLUMNS = (
+    ("serial", "Serial Number", 12),
+    ("description", "Description", 40),
+    ("hours", "Hours", 10),
+    ("price_exc", "Price Exc.", 12),
+    ("vat", "VAT", 10),
+    ("total", "Total", 12),
+)
+DELETE_WIDTH = 10
+
+# Fields edited by the user, in Tab order; also the column order of pasted rows
+EDITABLE_FIELDS = ("description", "hours", "price_exc", "vat")
+
+# Rows with widgets; the rest of the items are only in the model
+VISIBLE_ROWS = 15
+
+CELL_BG = "white"
+READONLY_BG = "#e9ecef"
+SELECTED_BG = "#cfe2ff"
+
+# Render state of a row without an item
+EMPTY_ROW = ()
+
+
+def new_item(description="", hours="", price_exc="", vat=""):
+    """
+    Returns a line item of the grid model. Values are kept as typed; the
+    total is derived from price_exc and vat.
+    """
+    item = {
+        "description": description,
+        "hours": hours,
+        "price_exc": price_exc,
+        "vat": vat,
+        "total": "0.00",
+    }
+    update_total(item)
+    return item
+
+
+def update_total(item):
+    try:
+        item["total"] = str(to_decimal(item["price_exc"]) + to_decimal(item["vat"]))
+    except ValueError:
+        item["total"] = "0.00"
+
+
+def item_cents(item):
+    """
+    Returns the (price_exc, vat) cents an item adds to the invoice totals.
+    Like generate_invoice, incomplete or invalid rows add nothing.
+    """
+    if not all(item[field] for field in EDITABLE_FIELDS):
+        return 0, 0
+    try:
+        float(item["hours"])
+        return to_cents(item["price_exc"]), to_cents(item["vat"])
+    except ValueError:
+        return 0, 0
+
+
+def parse_rows(text):
+    """
+    Splits pasted text, e.g. a timesheet copied from a spreadsheet, into
+    rows of (description, hours, price_exc, vat). Columns are separated by
+    tabs; missing trailing columns are empty and blank lines are skipped.
+    """
+    rows = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        cells = [cell.strip() for cell in line.split("\t")][:len(EDITABLE_FIELDS)]
+        cells += [""] * (len(EDITABLE_FIELDS) - len(cells))
+        rows.append(tuple(cells))
+    return rows
+
+
+class ItemModel:
+    """
+    Line items keyed by a stable id, plus their display order. Ids never
+    change, so the editor, the selection and the row widgets keep pointing
+    at the same item when others are inserted or deleted.
+
+    The invoice totals are kept as running sums in cents: every change
+    applies the difference of the affected item instead of summing all items.
+    """
+
+    def __init__(self):
+        self.items = {}  # id -> item
+        self.order = []  # ids in display order
+        self.ids = itertools.count(1)
+        self.cents = {}  # id -> (price_exc, vat) cents counted in the sums
+        self.total_exc_cents = 0
+        self.total_vat_cents = 0
+
+    def __len__(self):
+        return len(self.order)
+
+    def __iter__(self):
+        """Yields the items in display order."""
+        return (self.items[item_id] for item_id in self.order)
+
+    def __getitem__(self, item_id):
+        return self.items[item_id]
+
+    def id_at(self, position):
+        return self.order[position]
+
+    def insert(self, position, items):
+        """
+        Inserts items before position (at the end if None).
+
+        Returns:
+            list of int: The ids of the new items.
+        """
+        ids = [next(self.ids) for _ in items]
+        self.items.update(zip(ids, items))
+        for item_id in ids:
+            self.refresh(item_id)
+        if position is None:
+            self.order.extend(ids)
+        else:
+            self.order[position:position] = ids
+        return ids
+
+    def remove_at(self, position):
+        """Removes the item at position and returns its id."""
+        item_id = self.order.pop(position)
+        del self.items[item_id]
+        self._uncount(item_id)
+        return item_id
+
+    def remove(self, ids):
+        """Removes the items with the given ids in one pass over the order."""
+        ids = set(ids) & self.items.keys()
+        if not ids:
+            return
+        for item_id in ids:
+            del self.items[item_id]
+            self._uncount(item_id)
+        self.order = [item_id for item_id in self.order if item_id not in ids]
+
+    def clear(self):
+        self.items.clear()
+        self.order.clear()
+        self.cents.clear()
+        self.total_exc_cents = 0
+        self.total_vat_cents = 0
+
+    def refresh(self, item_id):
+        """Updates the sums after the item's values changed."""
+        exc, vat = item_cents(self.items[item_id])
+        old_exc, old_vat = self.cents.get(item_id, (0, 0))
+        self.cents[item_id] = (exc, vat)
+        self.total_exc_cents += exc - old_exc
+        self.total_vat_cents += vat - old_vat
+
+    def _uncount(self, item_id):
+        exc, vat = self.cents.pop(item_id, (0, 0))
+        self.total_exc_cents -= exc
+        self.total_vat_cents -= vat
+
+    def set_vat_exempt(self, vat_exempt):
+        """
+        Zeroes the VAT of every item, or clears the zeroed VAT fields, in
+        one pass that also recomputes the sums.
+        """
+        self.total_exc_cents = 0
+        self.total_vat_cents = 0
+        for item_id, item in self.items.items():
+            if vat_exempt:
+                item["vat"] = "0.00"
+            elif item["vat"] == "0.00":
+                item["vat"] = ""
+            update_total(item)
+            exc, vat = self.cents[item_id] = item_cents(item)
+            self.total_exc_cents += exc
+            self.total_vat_cents += vat
+
+    def totals(self):
+        """
+        Returns:
+            dict: Decimal 'total_exc', 'total_vat' and 'grand_total', as
+            calculate_totals returns them.
+        """
+        return {
+            "total_exc": from_cents(self.total_exc_cents),
+            "total_vat": from_cents(self.total_vat_cents),
+            "grand_total": from_cents(self.total_exc_cents + self.total_vat_cents),
+        }
+
+
+class ItemGrid(ttk.Frame):
+    """
+    Line item editor. Items live in an ItemModel and only the visible rows
+    have widgets, which are refilled when the grid scrolls. Cells are edited
+    through a single entry placed over the clicked cell; clicking a serial
+    number selects the row (Shift-click selects a range).
+    """
+
+    def __init__(self, master, hourly_rate, on_change=None, rows=VISIBLE_ROWS, **kwargs):
+        """
+        Parameters:
+            master: Parent widget.
+            hourly_rate (callable): Returns the current hourly rate; editing
+                hours sets the price to hours * rate.
+            on_change (callable): Called without arguments whenever the
+                totals may have changed, including while a cell is typed in.
+            rows (int): Number of visible rows.
+        """
+        super().__init__(master, **kwargs)
+        self.model = ItemModel()
+        self.hourly_rate = hourly_rate
+        self.on_change = on_change
+        self.vat_exempt = False
+        self.top = 0  # Position of the item in the first visible row
+        self.editing = None  # (item_id, field) of the open editor
+        self.edit_original = None  # Copy of the edited item before editing
+        self.selected = set()  # Ids of the selected items
+        self.anchor = None  # Position of the last serial click, for Shift-click ranges
+
+        for column, (field, header, width) in enumerate(COLUMNS):
+            ttk.Label(
+                self, text=header, width=width, bootstyle=INFO, anchor="center"
+            ).grid(row=0, column=column, padx=1, pady=5, sticky="ew")
+
+        self.rows = []
+        for row in range(rows):
+            cells = {}
+            for column, (field, header, width) in enumerate(COLUMNS):
+                cell = tk.Label(
+                    self,
+                    width=width,
+                    borderwidth=1,
+                    relief="solid",
+                    anchor="center" if field == "serial" else "w",
+                )
+                cell.grid(row=row + 1, column=column, padx=1, pady=1, sticky="nsew")
+                if field == "serial":
+                    cell.bind("<Button-1>", lambda event, row=row: self.toggle_selection(row))
+                    cell.bind("<Shift-Button-1>", lambda event, row=row: self.select_range(row))
+                else:
+                    cell.bind("<Button-1>", lambda event, row=row, field=field: self.start_edit(row, field))
+                cells[field] = cell
+            delete_button = tk.Button(
+                self,
+                text="Delete",
+                command=lambda row=row: self.delete_row(row),
+                width=DELETE_WIDTH,
+                bg="red",
+                fg="white"
+            )
+            delete_button.grid(row=row + 1, column=len(COLUMNS), padx=1, pady=1)
+            cells["delete_button"] = delete_button
+            self.rows.append(cells)
+        self.empty_bg = self.rows[0]["serial"].cget("background")
+        # What each row currently shows (None: unknown), so render only
+        # touches rows that change
+        self.shown = [None] * rows
+
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.yview, bootstyle=SECONDARY)
+        self.scrollbar.grid(row=1, column=len(COLUMNS) + 1, rowspan=rows, sticky="ns")
+
+        # Created after the cells so it is stacked above them. Typing updates
+        # the model right away, so the totals follow the keystrokes
+        self.editor_var = tk.StringVar()
+        self.editor_var.trace_add("write", lambda *args: self.on_editor_change())
+        self.editor = tk.Entry(self, textvariable=self.editor_var, borderwidth=1, relief="solid")
+        self.editor.bind("<Return>", lambda event: self.move_edit(1, 0))
+        self.editor.bind("<Down>", lambda event: self.move_edit(1, 0))
+        self.editor.bind("<Up>", lambda event: self.move_edit(-1, 0))
+        self.editor.bind("<Tab>", lambda event: self.move_edit(0, 1))
+        self.editor.bind("<Shift-Tab>", lambda event: self.move_edit(0, -1))
+        self.editor.bind("<ISO_Left_Tab>", lambda event: self.move_edit(0, -1))
+        self.editor.bind("<Escape>", lambda event: self.cancel_edit())
+        self.editor.bind("<FocusOut>", lambda event: self.commit_edit())
+        self.editor.bind("<<Paste>>", self.on_paste)
+
+        for widget in [self] + [cell for cells in self.rows for cell in cells.values()]:
+            widget.bind("<MouseWheel>", self.on_mousewheel)
+            widget.bind("<Button-4>", lambda event: self.yview("scroll", -3, "units"))
+            widget.bind("<Button-5>", lambda event: self.yview("scroll", 3, "units"))
+
+        self.render()
+
+    # ----- Model -----
+
+    @property
+    def items(self):
+        """The items in display order."""
+        return list(self.model)
+
+    def add_item(self, **values):
+        """
+        Appends an item and scrolls it into view.
+
+        Returns:
+            int: Id of the new item.
+        """
+        self.commit_edit()
+        (item_id,) = self.model.insert(None, [self._new_item(**values)])
+        self.see(len(self.model) - 1)
+        return item_id
+
+    def insert_rows(self, position, rows):
+        """
+        Inserts parsed (description, hours, price_exc, vat) rows at position.
+        A price left empty is calculated from the hours and the hourly rate.
+        """
+        self.commit_edit()
+        items = []
+        for description, hours, price_exc, vat in rows:
+            item = self._new_item(description=description, hours=hours, price_exc=price_exc, vat=vat)
+            if hours and not price_exc:
+                self._apply_hourly_rate(item)
+            items.append(item)
+        self.model.insert(position, items)
+        self.anchor = None
+        self.render()
+        self._changed()
+
+    def delete_row(self, row):
+        """Deletes the item shown in a visible row."""
+        position = self.top + row
+        if position >= len(self.model):
+            return
+        self.commit_edit()
+        self.selected.discard(self.model.remove_at(position))
+        self.anchor = None
+        # Rows above the deleted one keep their item, unless the view shifts up
+        self.render()
+        self._changed()
+
+    def delete_selected(self):
+        """
+        Deletes the selected items.
+
+        Returns:
+            int: Number of deleted items.
+        """
+        self.commit_edit()
+        count = len(self.selected)
+        self.model.remove(self.selected)
+        self.selected.clear()
+        self.anchor = None
+        self.render()
+        self._changed()
+        return count
+
+    def clear(self):
+        self.cancel_edit()
+        self.model.clear()
+        self.selected.clear()
+        self.anchor = None
+        self.top = 0
+        self.render()
+        self._changed()
+
+    def set_value(self, item_id, field, value):
+        item = self.model[item_id]
+        item[field] = value
+        if field == "hours":
+            self._apply_hourly_rate(item)
+        update_total(item)
+        self.model.refresh(item_id)
+        self._changed()
+
+    def set_vat_exempt(self, vat_exempt):
+        """
+        Sets VAT of every item to zero and makes it read-only, or restores
+        editing and clears the zeroed VAT fields.
+        """
+        self.commit_edit()
+        self.vat_exempt = bool(vat_exempt)
+        self.model.set_vat_exempt(self.vat_exempt)
+        self.shown = [None] * len(self.rows)
+        self.render()
+        self._changed()
+
+    def totals(self):
+        return self.model.totals()
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
+    def _new_item(self, **values):
+        item = new_item(**values)
+        if self.vat_exempt:
+            item["vat"] = "0.00"
+            update_total(item)
+        return item
+
+    def _apply_hourly_rate(self, item):
+        # Price Exc. follows hours * hourly rate
+        try:
+            rate = to_decimal(self.hourly_rate())
+            item["price_exc"] = str(to_decimal(rate * to_decimal(item["hours"])))
+        except (ValueError, tk.TclError):
+            pass  # Ignore invalid inputs
+        update_total(item)
+
+    # ----- Selection -----
+
+    def toggle_selection(self, row):
+        position = self.top + row
+        if position >= len(self.model):
+            return
+        self.commit_edit()
+        item_id = self.model.id_at(position)
+        if item_id in self.selected:
+            self.selected.remove(item_id)
+        else:
+            self.selected.add(item_id)
+        self.anchor = position
+        self.render()
+
+    def select_range(self, row):
+        position = self.top + row
+        if position >= len(self.model):
+            return
+        if self.anchor is None:
+            self.toggle_selection(row)
+            return
+        self.commit_edit()
+        first, last = sorted((self.anchor, position))
+        self.selected.update(self.model.order[first:last + 1])
+        self.render()
+
+    # ----- View -----
+
+    def render(self):
+        """
+        Fills the row widgets from the items currently scrolled into view.
+        Serial numbers are the display positions. Rows showing the same
+        item in the same state as before are left untouched.
+        """
+        self.top = max(0, min(self.top, len(self.model) - len(self.rows)))
+        for row, cells in enumerate(self.rows):
+            position = self.top + row
+            if position < len(self.model):
+                item_id = self.model.id_at(position)
+                item = self.model[item_id]
+                selected = item_id in self.selected
+                state = (item_id, position, selected, *(item[field] for field in EDITABLE_FIELDS))
+                if state == self.shown[row]:
+                    continue
+                for field, header, width in COLUMNS:
+                    text = str(position + 1) if field == "serial" else item[field]
+                    if selected:
+                        bg = SELECTED_BG
+                    elif field in EDITABLE_FIELDS and not (field == "vat" and self.vat_exempt):
+                        bg = CELL_BG
+                    else:
+                        bg = READONLY_BG
+                    cells[field].config(text=text, bg=bg)
+                if self.shown[row] in (None, EMPTY_ROW):
+                    cells["delete_button"].grid()
+            else:
+                state = EMPTY_ROW
+                if self.shown[row] == EMPTY_ROW:
+                    continue
+                for field, header, width in COLUMNS:
+                    cells[field].config(text="", bg=self.empty_bg)
+                cells["delete_button"].grid_remove()
+            self.shown[row] = state
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        if len(self.model) <= len(self.rows):
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.top / len(self.model),
+                               (self.top + len(self.rows)) / len(self.model))
+
+    def yview(self, *args):
+        """Scrollbar command: ('moveto', fraction) or ('scroll', n, 'units'|'pages')."""
+        self.commit_edit()
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * len(self.model))
+        elif args[0] == "scroll":
+            step = len(self.rows) if args[2] == "pages" else 1
+            self.top += int(args[1]) * step
+        self.render()
+
+    def on_mousewheel(self, event):
+        self.yview("scroll", -3 if event.delta > 0 else 3, "units")
+
+    def see(self, position):
+        """Scrolls so the item at position is visible."""
+        if position < self.top:
+            self.top = position
+        elif position >= self.top + len(self.rows):
+            self.top = position - len(self.rows) + 1
+        self.render()
+
+    # ----- Editing -----
+
+    def start_edit(self, row, field):
+        position = self.top + row
+        if position >= len(self.model) or field not in EDITABLE_FIELDS:
+            return
+        if field == "vat" and self.vat_exempt:
+            return
+        self.commit_edit()
+        item_id = self.model.id_at(position)
+        # The whole item: editing hours also rewrites Price Exc. and Total
+        self.edit_original = dict(self.model[item_id])
+        self.editor_var.set(self.edit_original[field])  # Before editing is set: not a change
+        self.editing = (item_id, field)
+        self.editor.place(in_=self.rows[row][field], x=0, y=0, relwidth=1, relheight=1)
+        self.editor.lift()
+        self.editor.focus_set()
+        self.editor.select_range(0, tk.END)
+
+    def commit_edit(self):
+        if self.editing is None:
+            return
+        item_id, field = self.editing
+        self.editing = None
+        self.editor.place_forget()
+        self.set_value(item_id, field, self.editor.get().strip())
+        self.render()
+
+    def cancel_edit(self):
+        """Closes the editor and restores the item as it was before editing."""
+        if self.editing is not None:
+            item_id, field = self.editing
+            self.editing = None
+            self.model[item_id].update(self.edit_original)
+            self.model.refresh(item_id)
+            self._changed()
+            self.render()
+        self.editor.place_forget()
+
+    def on_editor_change(self):
+        if self.editing is None:
+            return
+        item_id, field = self.editing
+        self.set_value(item_id, field, self.editor_var.get().strip())
+        self.render()
+
+    def editing_position(self):
+        # The edited item is always in view, since scrolling commits the edit
+        item_id, field = self.editing
+        for row in range(len(self.rows)):
+            position = self.top + row
+            if position < len(self.model) and self.model.id_at(position) == item_id:
+                return position
+        raise LookupError(item_id)
+
+    def move_edit(self, rows, fields):
+        """
+        Commits the open cell and edits a neighbour: rows down/up, or fields
+        to the right/left in Tab order, wrapping to the next/previous item.
+        Moving down from the last item adds a new one.
+        """
+        if self.editing is None:
+            return "break"
+        position = self.editing_position()
+        field = self.editing[1]
+        editable = [name for name in EDITABLE_FIELDS if not (name == "vat" and self.vat_exempt)]
+        column = editable.index(field) + fields
+        position += rows + column // len(editable)
+        field = editable[column % len(editable)]
+        self.commit_edit()
+        if position < 0:
+            return "break"
+        if position >= len(self.model):
+            self.model.insert(None, [self._new_item()])
+        self.see(position)
+        self.start_edit(position - self.top, field)
+        return "break"
+
+    def on_paste(self, event):
+        # Multi-line or tab-separated clipboard text becomes new rows
+        try:
+            text = self.editor.clipboard_get()
+        except tk.TclError:
+            return None
+        if "\n" not in text.strip() and "\t" not in text:
+            return None  # Plain paste into the cell
+        position = self.editing_position()
+        item_id = self.editing[0]
+        self.cancel_edit()
+        rows = parse_rows(text)
+        item = self.model[item_id]
+        if not (item["description"] or item["hours"] or item["price_exc"]):
+            self.model.remove_at(position)  # Replace the empty row pasted into
+            self.selected.discard(item_id)
+        self.insert_rows(position, rows)
+        self.see(min(position + len(rows), len(self.model)) - 1)
+        return "break"
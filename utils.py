@@ -1,5 +1,7 @@
 # utils.py
 
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
 def is_float(value):
     """
     Checks if the provided value can be converted to a float.
@@ -15,3 +17,82 @@ def is_float(value):
         return True
     except ValueError:
         return False
+
+
+# ----- Money -----
+# Amounts are handled as Decimal in the application and stored as integer
+# cents in the database, so sums never drift.
+
+CENT = Decimal("0.01")
+
+
+def to_decimal(value):
+    """
+    Converts a user or database value to a Decimal rounded to cents.
+
+    Parameters:
+        value (str, int, float or Decimal): The amount. Empty strings and
+            None count as zero.
+
+    Returns:
+        Decimal: The amount rounded half-up to two decimals.
+
+    Raises:
+        ValueError: If the value is not a number.
+    """
+    if value is None:
+        value = "0"
+    elif isinstance(value, float):
+        value = repr(value)  # Shortest form, so 0.1 stays 0.1
+    elif not isinstance(value, Decimal):
+        value = str(value).strip() or "0"
+    try:
+        return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {value}")
+
+
+def to_cents(value):
+    """
+    Converts an amount to integer cents.
+    """
+    return int(to_decimal(value) * 100)
+
+
+def from_cents(cents):
+    """
+    Converts integer cents to a Decimal amount.
+    """
+    return (Decimal(cents or 0) / 100).quantize(CENT)
+
+
+def format_money(value):
+    """
+    Formats an amount for display, e.g. "€1234.50".
+    """
+    return f"€{to_decimal(value)}"
+
+
+def calculate_totals(items, vat_exempt):
+    """
+    Calculates invoice totals from line items.
+
+    Parameters:
+        items (iterable of dict): Items with 'price_exc' and 'vat' amounts.
+        vat_exempt (bool): VAT exemption flag; VAT is not charged if set.
+
+    Returns:
+        dict: Decimal 'total_exc', 'total_vat' and 'grand_total'.
+    """
+    total_exc = Decimal("0.00")
+    total_vat = Decimal("0.00")
+    for item in items:
+        total_exc += to_decimal(item["price_exc"])
+        total_vat += to_decimal(item["vat"])
+    if vat_exempt:
+        total_vat = Decimal("0.00")
+    return {
+        "total_exc": total_exc,
+        "total_vat": total_vat,
+        "grand_total": total_exc + total_vat,
+    }